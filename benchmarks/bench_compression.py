@@ -0,0 +1,81 @@
+"""
+Benchmark for API response compression (src/compression.py).
+
+For note-list JSON payloads of increasing size, reports the bytes saved and
+the CPU time spent per request for every available encoding, then checks
+the end-to-end size of a streamed GET /api/notes through the Flask app.
+
+Usage: python benchmarks/bench_compression.py [note_count]
+"""
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+NOTE_COUNT = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+SIZES = (1024, 16 * 1024, 128 * 1024, 1024 * 1024)
+ROUNDS = 20
+
+os.environ.pop('VERCEL_ENV', None)
+os.environ.pop('RESPONSE_CACHE', None)
+os.environ['DATABASE_URL'] = f"sqlite:///{tempfile.mkdtemp()}/bench.db"
+
+from src.compression import RESPONSE_ENCODINGS, compressor  # noqa: E402
+from src.main import app  # noqa: E402
+from src.models.note import Note, db  # noqa: E402
+
+
+def seed():
+    with app.app_context():
+        db.session.add_all(
+            Note(title=f'Meeting notes {i}', content=f'Discussed item {i} and next steps. ' * 15,
+                 tags='work,weekly')
+            for i in range(NOTE_COUNT)
+        )
+        db.session.commit()
+
+
+def payload(body, size):
+    # slices of the real list, so repeated text is only as common as in real notes
+    while len(body) < size:
+        body += body
+    return body[:size]
+
+
+def cpu_per_request(data, encoding):
+    start = time.process_time()
+    for _ in range(ROUNDS):
+        stream = compressor(encoding)
+        out = stream.compress(data) + stream.flush()
+    return len(out), (time.process_time() - start) / ROUNDS * 1000
+
+
+def main():
+    seed()
+    client = app.test_client()
+    # also warms the serialization cache so the runs below compare like with like
+    notes = client.get('/api/notes', headers={'Accept-Encoding': 'identity'}).get_data()
+
+    print(f"encodings available: {', '.join(RESPONSE_ENCODINGS)}")
+    print(f"{'size':>9} {'enc':>5} {'out':>9} {'saved':>7} {'cpu ms':>8}")
+    for size in SIZES:
+        data = payload(notes, size)
+        for encoding in RESPONSE_ENCODINGS:
+            out, ms = cpu_per_request(data, encoding)
+            print(f"{size:>9} {encoding:>5} {out:>9} {1 - out / size:>7.1%} {ms:>8.3f}")
+
+    print(f"\nGET /api/notes ({NOTE_COUNT} notes, streamed)")
+    for encoding in ('identity',) + RESPONSE_ENCODINGS:
+        start = time.perf_counter()
+        response = client.get('/api/notes', headers={'Accept-Encoding': encoding})
+        size = len(response.get_data())
+        elapsed = (time.perf_counter() - start) * 1000
+        print(f"  {encoding:>8}: {size:>9} bytes on the wire, {elapsed:7.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
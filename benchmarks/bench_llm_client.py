@@ -0,0 +1,64 @@
+"""
+Benchmark for the pooled LLM client (src/llm.py).
+
+Starts a local fake OpenAI-compatible server that counts the TCP connections
+it accepts, then makes the same chat completion calls twice: once with a new
+OpenAI client per call (the old behaviour) and once through call_llm_model's
+shared client. Reports connections opened and first/average call latency.
+
+Usage: python benchmarks/bench_llm_client.py [calls] [server_delay_ms]
+"""
+import os
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+# the fake endpoint is shared with the tests
+from tests.fake_llm import FakeCompletions, start_server  # noqa: E402
+
+CALLS = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+SERVER_DELAY = (float(sys.argv[2]) if len(sys.argv) > 2 else 5) / 1000
+
+
+def use_fake_endpoint(server):
+    """Point src.llm at ``server``; call before src.llm is imported."""
+    os.environ['LLM_ENDPOINT'] = f'http://127.0.0.1:{server.server_port}/v1'
+    os.environ.setdefault('GITHUB_TOKEN', 'fake-token')
+    # the fake server has no quota, so keep the client-side scheduler from pacing calls
+    os.environ.setdefault('LLM_REQUESTS_PER_MINUTE', '0')
+
+
+def run(label, call):
+    FakeCompletions.connections = FakeCompletions.requests = 0
+    latencies = []
+    for i in range(CALLS):
+        start = time.perf_counter()
+        call([{'role': 'user', 'content': f'hello {i}'}])
+        latencies.append((time.perf_counter() - start) * 1000)
+    average = sum(latencies[1:]) / max(len(latencies) - 1, 1)
+    print(f"{label:>16}: {FakeCompletions.requests} calls over {FakeCompletions.connections} connections, "
+          f"first {latencies[0]:.1f} ms, then avg {average:.1f} ms")
+
+
+def main():
+    server = start_server(SERVER_DELAY)
+    use_fake_endpoint(server)
+
+    from openai import OpenAI
+    from src import llm
+
+    def per_call_client(messages):
+        client = OpenAI(base_url=llm.endpoint, api_key=os.environ['GITHUB_TOKEN'])
+        return client.chat.completions.create(messages=messages, model=llm.model).choices[0].message.content
+
+    run('client per call', per_call_client)
+    run('pooled client', lambda messages: llm.call_llm_model(llm.model, messages))
+    print(f"llm_stats(): {llm.llm_stats()}")
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
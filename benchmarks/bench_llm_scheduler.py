@@ -0,0 +1,142 @@
+"""
+Benchmark for the client-side LLM scheduler (src/llm_scheduler.py).
+
+Starts a local fake OpenAI-compatible server that enforces a quota (requests
+per second and concurrent requests) and answers 429 + Retry-After beyond it,
+then sends a burst of translation-sized calls from many threads, once with
+the scheduler effectively off and once configured to the server's quota.
+Reports completed calls, 429s seen by the server and wall time.
+
+Usage: python benchmarks/bench_llm_scheduler.py [calls] [requests_per_second]
+"""
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+# the burst itself runs in a child process, so each run imports the scheduler with its own settings
+CHILD = '--burst' in sys.argv
+if CHILD:
+    sys.argv.remove('--burst')
+CALLS = int(sys.argv[1]) if len(sys.argv) > 1 else 40
+RATE = float(sys.argv[2]) if len(sys.argv) > 2 else 10
+CONCURRENCY = 3
+SERVER_DELAY = 0.1
+
+
+class QuotaServer(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    lock = threading.Lock()
+    level = RATE
+    updated = time.monotonic()
+    in_flight = 0
+    served = 0
+    rejected = 0
+
+    def _admit(self):
+        cls = QuotaServer
+        with cls.lock:
+            now = time.monotonic()
+            cls.level = min(RATE, cls.level + (now - cls.updated) * RATE)
+            cls.updated = now
+            if cls.level < 1 or cls.in_flight >= CONCURRENCY:
+                cls.rejected += 1
+                return False
+            cls.level -= 1
+            cls.in_flight += 1
+            return True
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        if not self._admit():
+            self._send(429, {'error': {'message': 'Rate limit exceeded'}}, {'Retry-After': '1'})
+            return
+        try:
+            time.sleep(SERVER_DELAY)
+        finally:
+            with QuotaServer.lock:
+                QuotaServer.in_flight -= 1
+                QuotaServer.served += 1
+        self._send(200, {
+            'id': 'chatcmpl-fake',
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': body.get('model'),
+            'choices': [{
+                'index': 0,
+                'message': {'role': 'assistant', 'content': 'ok'},
+                'finish_reason': 'stop',
+            }],
+            'usage': {'prompt_tokens': 50, 'completion_tokens': 10, 'total_tokens': 60},
+        })
+
+    def _send(self, status, payload, headers=None):
+        data = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+def burst():
+    """Runs in a child process configured through the environment."""
+    from src import llm, llm_scheduler
+    failures = []
+
+    def call(i):
+        try:
+            llm.translate_to_language(f'paragraph {i} ' * 20, 'French')
+        except Exception as e:
+            failures.append(type(e).__name__)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=20) as pool:
+        list(pool.map(call, range(CALLS)))
+    elapsed = (time.perf_counter() - start) * 1000
+    print(json.dumps({'ms': elapsed, 'failures': failures, 'stats': llm_scheduler.stats()}))
+
+
+def run(label, server, env):
+    QuotaServer.served = QuotaServer.rejected = 0
+    child_env = dict(os.environ, LLM_ENDPOINT=f'http://127.0.0.1:{server.server_port}/v1',
+                     GITHUB_TOKEN='fake-token', **env)
+    output = subprocess.run([sys.executable, __file__, '--burst', str(CALLS), str(RATE)],
+                            env=child_env, capture_output=True, text=True, check=True).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    print(f"{label:>18}: {CALLS - len(result['failures'])}/{CALLS} calls succeeded, "
+          f"{QuotaServer.rejected} 429s from the server, {result['ms']:.0f} ms")
+
+
+def main():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), QuotaServer)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    # the SDK's own retries (2, with backoff) stay on in both runs
+    run('no scheduling', server, {'LLM_REQUESTS_PER_MINUTE': '0', 'LLM_MAX_CONCURRENCY': '100',
+                                  'LLM_TOKENS_PER_MINUTE': '0'})
+    # the fake quota refills every second, so the client may only burst one second's worth
+    run('scheduled', server, {'LLM_REQUESTS_PER_MINUTE': str(RATE * 60), 'LLM_BURST_SECONDS': '1',
+                              'LLM_MAX_CONCURRENCY': str(CONCURRENCY)})
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    if CHILD:
+        burst()
+    else:
+        main()
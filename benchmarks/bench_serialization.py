@@ -0,0 +1,75 @@
+"""
+Microbenchmark for the per-note JSON fragment cache (Note.to_json).
+
+Seeds a throwaway SQLite database with 10k notes and times GET /api/notes
+(full and summary views) cold vs. warm, plus the raw encode step on its own.
+
+Usage: python benchmarks/bench_serialization.py [note_count]
+"""
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+NOTE_COUNT = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+ROUNDS = 5
+
+os.environ.pop('VERCEL_ENV', None)
+os.environ['DATABASE_URL'] = f"sqlite:///{tempfile.mkdtemp()}/bench.db"
+os.environ.setdefault('NOTE_JSON_CACHE_SIZE', str(NOTE_COUNT * 2))
+
+from src.main import app  # noqa: E402
+from src.models.note import Note, db, json_fragments  # noqa: E402
+
+
+def seed():
+    with app.app_context():
+        db.session.add_all(
+            Note(title=f'Note {i}', content=f'Body of note {i}. ' * 20, tags='work,bench')
+            for i in range(NOTE_COUNT)
+        )
+        db.session.commit()
+
+
+def timed(client, url):
+    start = time.perf_counter()
+    response = client.get(url)
+    body = response.get_data()
+    return time.perf_counter() - start, len(body)
+
+
+def bench_endpoint(client, url):
+    json_fragments.clear()
+    cold, size = timed(client, url)
+    warm = min(timed(client, url)[0] for _ in range(ROUNDS))
+    print(f"{url:<28} {size / 1024:>8.0f} KiB  cold {cold * 1000:>7.1f} ms  warm {warm * 1000:>7.1f} ms")
+
+
+def bench_encode():
+    with app.app_context():
+        notes = Note.query.all()
+        start = time.perf_counter()
+        for note in notes:
+            app.json.dumps(note.to_dict())
+        uncached = time.perf_counter() - start
+        for note in notes:
+            note.to_json()
+        start = time.perf_counter()
+        for note in notes:
+            note.to_json()
+        cached = time.perf_counter() - start
+    print(f"encode {len(notes)} notes: to_dict+dumps {uncached * 1000:.1f} ms, cached to_json {cached * 1000:.1f} ms")
+
+
+if __name__ == '__main__':
+    seed()
+    client = app.test_client()
+    print(f"{NOTE_COUNT} notes, best of {ROUNDS} warm runs")
+    bench_endpoint(client, '/api/notes')
+    bench_endpoint(client, '/api/notes?view=summary')
+    bench_encode()
+    print(f"cache: {json_fragments.stats()}")
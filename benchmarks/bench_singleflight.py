@@ -0,0 +1,75 @@
+"""
+Benchmark for coalescing identical in-flight LLM calls (src/llm.py).
+
+Starts a local fake OpenAI-compatible server that counts completions, then
+fires the same chat completion from many threads at once, and from several
+processes sharing LLM_SINGLEFLIGHT_DIR. Reports upstream requests made for
+the calls issued and the wall time of each burst.
+
+Usage: python benchmarks/bench_singleflight.py [callers] [server_delay_ms]
+"""
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / 'benchmarks'))
+
+from bench_llm_client import FakeCompletions, start_server, use_fake_endpoint
+
+CALLERS = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+SERVER_DELAY = (float(sys.argv[2]) if len(sys.argv) > 2 else 200) / 1000
+MESSAGES = [{'role': 'user', 'content': 'translate this note'}]
+
+
+def burst(label, call, callers):
+    FakeCompletions.requests = 0
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=callers) as pool:
+        replies = set(pool.map(lambda i: call(), range(callers)))
+    elapsed = (time.perf_counter() - start) * 1000
+    print(f"{label:>24}: {callers} calls -> {FakeCompletions.requests} upstream, "
+          f"{len(replies)} distinct replies, {elapsed:.0f} ms")
+
+
+def _process_caller(args):
+    lock_dir, calls = args
+    os.environ['LLM_SINGLEFLIGHT_DIR'] = lock_dir
+    from src import llm
+    with ThreadPoolExecutor(max_workers=calls) as pool:
+        list(pool.map(lambda i: llm.call_llm_model(llm.model, MESSAGES), range(calls)))
+    return llm.llm_stats()
+
+
+def main():
+    server = start_server(SERVER_DELAY)
+    use_fake_endpoint(server)
+    os.environ.setdefault('LLM_MAX_CONCURRENCY', '100')
+
+    from src import llm
+    burst('no coalescing', lambda: llm._call_upstream(llm.model, MESSAGES, 1.0, 1.0, None), CALLERS)
+    burst('coalesced (threads)', lambda: llm.call_llm_model(llm.model, MESSAGES), CALLERS)
+
+    processes = 4
+    with tempfile.TemporaryDirectory() as lock_dir:
+        FakeCompletions.requests = 0
+        start = time.perf_counter()
+        with multiprocessing.get_context('spawn').Pool(processes) as pool:
+            stats = pool.map(_process_caller, [(lock_dir, CALLERS // processes)] * processes)
+        elapsed = (time.perf_counter() - start) * 1000
+    coalesced = sum(s['coalesced'] for s in stats)
+    across = sum(s['coalesced_across_processes'] for s in stats)
+    print(f"{'coalesced (processes)':>24}: {processes * (CALLERS // processes)} calls -> "
+          f"{FakeCompletions.requests} upstream ({coalesced} in-process, {across} across processes), "
+          f"{elapsed:.0f} ms incl. process start")
+    print(f"llm_stats(): {llm.llm_stats()}")
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+"""
+Benchmark for translating a note's title and content (POST /notes/<id>/translate).
+
+Runs a local fake OpenAI-compatible endpoint that sleeps for a fixed latency
+per completion, then compares the old two sequential calls, the concurrent
+fallback and the single structured call, and times the endpoint itself
+(translation cache bypassed by using a new target language every time).
+
+Usage: python benchmarks/bench_translate.py [latency_ms] [rounds]
+"""
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / 'benchmarks'))
+
+from bench_llm_client import use_fake_endpoint
+
+LATENCY = (float(sys.argv[1]) if len(sys.argv) > 1 else 300) / 1000
+ROUNDS = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+
+class SlowTranslator(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        time.sleep(LATENCY)
+        prompt = body['messages'][-1]['content']
+        source = prompt.rsplit('\n\n', 1)[-1].removeprefix('Text:\n')
+        if body.get('response_format', {}).get('type') == 'json_object':
+            reply = json.dumps({k: f'[translated] {v}' for k, v in json.loads(source).items()})
+        else:
+            reply = f'[translated] {source}'
+        payload = json.dumps({
+            'id': 'chatcmpl-fake',
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': body.get('model'),
+            'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': reply}, 'finish_reason': 'stop'}],
+        }).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+def timed(label, fn):
+    fn()  # warm up the client and connections
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        fn()
+    elapsed = (time.perf_counter() - start) / ROUNDS * 1000
+    print(f"{label:>28}: {elapsed:7.1f} ms")
+    return elapsed
+
+
+def main():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), SlowTranslator)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    use_fake_endpoint(server)
+    os.environ.pop('VERCEL_ENV', None)
+    os.environ.pop('RESPONSE_CACHE', None)
+    os.environ['DATABASE_URL'] = f"sqlite:///{tempfile.mkdtemp()}/bench.db"
+
+    from src import llm
+    from src.main import app
+    from src.routes import note as note_routes
+
+    fields = {'title': 'Team sync', 'content': 'Discuss the launch plan.\nBring the slides.'}
+    print(f"stub latency {LATENCY * 1000:.0f} ms per completion")
+    sequential = timed('sequential (before)', lambda: [
+        llm.translate_to_language(text, 'French') for text in fields.values()
+    ])
+    timed('concurrent fallback', lambda: _concurrent(note_routes, fields))
+    combined = timed('single structured call', lambda: llm.translate_fields(fields, 'French'))
+
+    client = app.test_client()
+    note_id = client.post('/api/notes', json=fields).get_json()['id']
+    targets = iter(range(10 ** 6))
+    endpoint = timed('POST /translate (uncached)', lambda: client.post(
+        f'/api/notes/{note_id}/translate', json={'target_language': f'lang-{next(targets)}'}
+    ))
+    print(f"\nstructured call / sequential: {combined / sequential:.2f}; endpoint / sequential: {endpoint / sequential:.2f}")
+    server.shutdown()
+
+
+def _concurrent(note_routes, fields):
+    # force the fallback path by making the structured call unusable
+    original = note_routes.translate_fields
+
+    def unusable(*args):
+        raise note_routes.UnusableTranslation('disabled for benchmark')
+
+    note_routes.translate_fields = unusable
+    try:
+        return note_routes._translate_uncached(fields, 'French')
+    finally:
+        note_routes.translate_fields = original
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+"""
+Circuit breaker for the inference endpoint.
+
+When the endpoint is down or very slow, every LLM-backed request would wait
+for the client timeout and hold a worker meanwhile. The breaker counts
+consecutive failed calls (connection errors, timeouts, 5xx) and calls slower
+than LLM_BREAKER_SLOW_SECONDS; after LLM_BREAKER_FAILURES of them it opens
+and calls fail at once with CircuitOpen for LLM_BREAKER_COOLDOWN seconds.
+Then it lets one trial call through (half-open): success closes it again,
+failure reopens it for another cooldown.
+
+State is per process and per model.
+"""
+import os
+import threading
+import time
+
+from src.llm_scheduler import Overloaded
+
+LLM_BREAKER_FAILURES = int(os.environ.get('LLM_BREAKER_FAILURES', 5))
+LLM_BREAKER_SLOW_SECONDS = float(os.environ.get('LLM_BREAKER_SLOW_SECONDS', 20))
+LLM_BREAKER_COOLDOWN = float(os.environ.get('LLM_BREAKER_COOLDOWN', 30))
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitOpen(Overloaded):
+    """The endpoint is considered down; the call was not attempted."""
+
+
+class CircuitBreaker:
+    def __init__(self, failures=LLM_BREAKER_FAILURES, cooldown=LLM_BREAKER_COOLDOWN,
+                 slow_seconds=LLM_BREAKER_SLOW_SECONDS):
+        self.failures = failures
+        self.cooldown = cooldown
+        self.slow_seconds = slow_seconds
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.trips = 0
+        self.rejected = 0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """Raise CircuitOpen unless a call may go to the endpoint now."""
+        with self._lock:
+            if self.state == OPEN:
+                remaining = self.opened_at + self.cooldown - time.monotonic()
+                if remaining > 0:
+                    self.rejected += 1
+                    raise CircuitOpen('The language model is unavailable, please try again later',
+                                      retry_after=remaining)
+                self.state = HALF_OPEN
+            if self.state == HALF_OPEN:
+                # one trial call at a time while half-open
+                if self._probing:
+                    self.rejected += 1
+                    raise CircuitOpen('The language model is unavailable, please try again later',
+                                      retry_after=1)
+                self._probing = True
+
+    def record(self, failed, elapsed):
+        """Count a call that reached the endpoint (``failed``: it did not answer in time or at all)."""
+        with self._lock:
+            self._probing = False
+            if failed or elapsed > self.slow_seconds:
+                self.consecutive_failures += 1
+                if self.state == HALF_OPEN or self.consecutive_failures >= self.failures:
+                    if self.state != OPEN:
+                        self.trips += 1
+                    self.state = OPEN
+                    self.opened_at = time.monotonic()
+            else:
+                self.consecutive_failures = 0
+                self.state = CLOSED
+
+    def cancel(self):
+        """The call was not made after all (e.g. it was never scheduled); no verdict."""
+        with self._lock:
+            self._probing = False
+
+    def stats(self):
+        with self._lock:
+            retry_after = None
+            if self.state == OPEN:
+                retry_after = round(max(0.0, self.opened_at + self.cooldown - time.monotonic()), 1)
+            return {
+                'state': self.state,
+                'consecutive_failures': self.consecutive_failures,
+                'trips': self.trips,
+                'rejected': self.rejected,
+                'retry_after_s': retry_after,
+            }
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get(model):
+    with _breakers_lock:
+        if model not in _breakers:
+            _breakers[model] = CircuitBreaker()
+        return _breakers[model]
+
+
+def stats():
+    """Breaker state per model for this process."""
+    with _breakers_lock:
+        breakers = dict(_breakers)
+    return {model: breaker.stats() for model, breaker in breakers.items()}
@@ -0,0 +1,133 @@
+"""
+Content-Encoding helpers shared by the static file server and the API.
+
+gzip is always available; brotli and zstd are used when the optional
+``brotli`` / ``zstandard`` packages are installed. Encodings are listed in
+server preference order and the client's Accept-Encoding q-values decide
+between them.
+"""
+import gzip
+import os
+import zlib
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# precompressed static files: best ratio, encoded once
+ENCODINGS = (('br',) if brotli is not None else ()) + ('gzip',)
+# per-response compression: zstd and low-quality brotli beat gzip on CPU per byte saved
+RESPONSE_ENCODINGS = (
+    (('zstd',) if zstandard is not None else ())
+    + (('br',) if brotli is not None else ())
+    + ('gzip',)
+)
+COMPRESSIBLE_TYPES = (
+    'text/', 'application/json', 'application/javascript', 'application/xml', 'image/svg+xml',
+)
+# below this many bytes the headers and CPU outweigh the saving
+MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE', 1024))
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 4
+ZSTD_LEVEL = 3
+
+
+def negotiate(accept_encodings, available=ENCODINGS):
+    """Best of ``available`` for a parsed Accept-Encoding header, or None for identity."""
+    return accept_encodings.best_match(available)
+
+
+def compress(data, encoding):
+    """Compress ``data`` at the highest level; meant for content encoded once and reused."""
+    if encoding == 'gzip':
+        # fixed mtime keeps the output (and anything hashed from it) reproducible
+        return gzip.compress(data, compresslevel=9, mtime=0)
+    if encoding == 'br' and brotli is not None:
+        return brotli.compress(data, quality=11)
+    raise ValueError(f'Unsupported encoding: {encoding}')
+
+
+class _BrotliStream:
+    def __init__(self):
+        self._compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+
+    def compress(self, data):
+        return self._compressor.process(data)
+
+    def flush(self):
+        return self._compressor.finish()
+
+
+def compressor(encoding):
+    """Incremental compressor for ``encoding`` with ``compress(data)`` and a final ``flush()``."""
+    if encoding == 'gzip':
+        return zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+    if encoding == 'br' and brotli is not None:
+        return _BrotliStream()
+    if encoding == 'zstd' and zstandard is not None:
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+    raise ValueError(f'Unsupported encoding: {encoding}')
+
+
+def _compress_stream(chunks, encoding):
+    stream = compressor(encoding)
+    try:
+        for chunk in chunks:
+            data = stream.compress(chunk.encode('utf-8') if isinstance(chunk, str) else chunk)
+            if data:
+                yield data
+        yield stream.flush()
+    finally:
+        # closing the wrapped iterable runs stream_with_context's teardown
+        close = getattr(chunks, 'close', None)
+        if close is not None:
+            close()
+
+
+def compress_response(response, accept_encodings):
+    """Compress an outgoing response for the client when it is worth it.
+
+    Skips bodiless and partial responses, ones that are already encoded or
+    marked no-transform, non-text types, event streams and bodies smaller than
+    MIN_SIZE. Streamed (generator) bodies are compressed chunk by chunk.
+    """
+    if response.status_code < 200 or response.status_code in (204, 206, 304):
+        return response
+    if response.direct_passthrough or 'Content-Encoding' in response.headers:
+        return response
+    mimetype = response.mimetype or ''
+    if mimetype == 'text/event-stream' or not mimetype.startswith(COMPRESSIBLE_TYPES):
+        return response
+    if 'no-transform' in response.headers.get('Cache-Control', ''):
+        return response
+    if not response.is_streamed and len(response.get_data()) < MIN_SIZE:
+        return response
+
+    response.vary.add('Accept-Encoding')
+    encoding = negotiate(accept_encodings, RESPONSE_ENCODINGS)
+    if encoding is None:
+        return response
+
+    if response.is_streamed:
+        response.response = _compress_stream(response.response, encoding)
+        response.headers.pop('Content-Length', None)
+    else:
+        data = response.get_data()
+        stream = compressor(encoding)
+        body = stream.compress(data) + stream.flush()
+        if len(body) >= len(data):
+            return response
+        response.set_data(body)
+    response.headers['Content-Encoding'] = encoding
+
+    # the encoded bytes differ from the identity ones, so the validator can only be weak
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
@@ -5,7 +5,7 @@ from flask import jsonify, request
 import json
 import csv
 from io import StringIO
-from datetime import datetime
+from datetime import datetime, timezone
 
 def export_notes_json(notes):
     """Export notes as JSON"""
@@ -57,4 +57,70 @@ def export_notes_markdown(notes):
         
         md_content += "---\n\n"
     
-    return md_content
\ No newline at end of file
+    return md_content
+
+def _ics_escape(text):
+    """Escape a TEXT value per RFC 5545."""
+    return (
+        (text or '')
+        .replace('\\', '\\\\')
+        .replace(';', '\\;')
+        .replace(',', '\\,')
+        .replace('\r\n', '\\n')
+        .replace('\n', '\\n')
+    )
+
+def _ics_fold(line):
+    """Fold a content line at 75 octets without splitting UTF-8 characters."""
+    folded = []
+    current = ''
+    size = 0
+    for ch in line:
+        width = len(ch.encode('utf-8'))
+        # continuation lines start with a space, which counts towards the limit
+        if size + width > 75:
+            folded.append(current)
+            current = ' '
+            size = 1
+        current += ch
+        size += width
+    folded.append(current)
+    return '\r\n'.join(folded) + '\r\n'
+
+def _ics_event(note):
+    lines = [
+        'BEGIN:VEVENT',
+        f'UID:note-{note.id}@note-taking-app',
+    ]
+    stamp = note.updated_at or note.created_at or datetime.utcnow()
+    # timestamps are stored as naive UTC
+    lines.append('DTSTAMP:' + stamp.replace(tzinfo=timezone.utc).strftime('%Y%m%dT%H%M%SZ'))
+    if note.event_time:
+        # floating local time, like the app itself shows it
+        start = datetime.combine(note.event_date, note.event_time)
+        lines.append('DTSTART:' + start.strftime('%Y%m%dT%H%M%S'))
+    else:
+        lines.append('DTSTART;VALUE=DATE:' + note.event_date.strftime('%Y%m%d'))
+    lines.append('SUMMARY:' + _ics_escape(note.title))
+    if note.content:
+        lines.append('DESCRIPTION:' + _ics_escape(note.content))
+    if note.tags:
+        lines.append('CATEGORIES:' + ','.join(_ics_escape(t.strip()) for t in note.tags.split(',') if t.strip()))
+    lines.append('END:VEVENT')
+    return ''.join(_ics_fold(line) for line in lines)
+
+def iter_notes_ics(notes):
+    """Yield an iCalendar (RFC 5545) feed for dated notes, one chunk per event.
+
+    Works on any iterable (e.g. a yield_per query), so the feed can be streamed.
+    """
+    yield ''.join(_ics_fold(line) for line in (
+        'BEGIN:VCALENDAR',
+        'VERSION:2.0',
+        'PRODID:-//Note Taking App//Agenda//EN',
+        'CALSCALE:GREGORIAN',
+    ))
+    for note in notes:
+        if note.event_date:
+            yield _ics_event(note)
+    yield _ics_fold('END:VCALENDAR')
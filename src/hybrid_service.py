@@ -27,7 +27,7 @@ class HybridDataService:
         else:
             # Use SQLAlchemy
             from .models.note import Note
-            notes = Note.query.order_by(Note.position).all()
+            notes = Note.query.order_by(Note.sort_key, Note.id).all()
             return [note.to_dict() for note in notes]
     
     def create_note(self, data):
@@ -0,0 +1,155 @@
+"""
+Idempotency-Key support for POST endpoints that are expensive or not safe to repeat.
+
+The first request with a key inserts an ``in_flight`` row; the insert is the
+lock, so only one request per key runs even across gunicorn workers. When it
+finishes, its response is stored and later requests with the same key get it
+back (with ``Idempotent-Replayed: true``) without running the endpoint
+again. A retry that arrives while the first request is still running waits
+for its response. Responses that only say "try again" (429, 5xx) are not
+stored, so retrying such a request runs it again. Keys expire after
+IDEMPOTENCY_TTL_SECONDS.
+"""
+import hashlib
+import json
+import os
+import time
+from datetime import datetime, timedelta
+
+from flask import Response
+from sqlalchemy import and_
+from sqlalchemy.exc import IntegrityError
+
+from src.models.user import db
+from src.models.idempotency import IdempotencyKey
+
+IDEMPOTENCY_TTL_SECONDS = int(os.environ.get('IDEMPOTENCY_TTL_SECONDS', 24 * 3600))
+# how long a retry waits for the first request with its key to finish
+IDEMPOTENCY_WAIT_SECONDS = float(os.environ.get('IDEMPOTENCY_WAIT_SECONDS', 30))
+# how long a request may hold its key before it is presumed dead
+IDEMPOTENCY_LEASE_SECONDS = int(os.environ.get('IDEMPOTENCY_LEASE_SECONDS', 120))
+WAIT_POLL_SECONDS = 0.1
+MAX_KEY_LENGTH = 255
+# response headers stored and replayed along with the body
+REPLAYED_HEADERS = ('Location', 'Preference-Applied')
+
+
+class KeyConflict(Exception):
+    """The key was already used with a different request body."""
+
+
+class KeyInFlight(Exception):
+    """The first request with this key is still running."""
+
+
+def request_hash(payload):
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def _row_key(scope, key):
+    return hashlib.sha256(f'{scope}\0{key}'.encode('utf-8')).hexdigest()
+
+
+def _claim(row_key, fingerprint):
+    """Take the key for this request; returns None if taken, else the stored row values."""
+    table = IdempotencyKey.__table__
+    now = datetime.utcnow()
+    with db.engine.begin() as conn:
+        conn.execute(table.delete().where(table.c.expires_at < now))
+    # the insert gets a transaction of its own: a duplicate key aborts it
+    # (on PostgreSQL the whole transaction), and the purge above must still commit
+    try:
+        with db.engine.begin() as conn:
+            conn.execute(table.insert().values(
+                key=row_key,
+                request_hash=fingerprint,
+                status='in_flight',
+                lease_until=now + timedelta(seconds=IDEMPOTENCY_LEASE_SECONDS),
+                created_at=now,
+                expires_at=now + timedelta(seconds=IDEMPOTENCY_TTL_SECONDS)
+            ))
+        return None
+    except IntegrityError:
+        pass
+    with db.engine.begin() as conn:
+        # take over a key whose request died while holding it
+        taken = conn.execute(
+            table.update()
+            .where(
+                table.c.key == row_key,
+                table.c.request_hash == fingerprint,
+                and_(table.c.status == 'in_flight', table.c.lease_until < now)
+            )
+            .values(lease_until=now + timedelta(seconds=IDEMPOTENCY_LEASE_SECONDS))
+        ).rowcount
+        if taken:
+            return None
+        return conn.execute(table.select().where(table.c.key == row_key)).first()
+
+
+def _read(row_key):
+    table = IdempotencyKey.__table__
+    with db.engine.connect() as conn:
+        return conn.execute(table.select().where(table.c.key == row_key)).first()
+
+
+def _replay(row):
+    response = Response(row.body, status=row.status_code, mimetype='application/json')
+    response.headers.update(json.loads(row.headers or '{}'))
+    response.headers['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def _store(row_key, response):
+    table = IdempotencyKey.__table__
+    with db.engine.begin() as conn:
+        if response.status_code == 429 or response.status_code >= 500:
+            # nothing was done that a retry must not repeat; let the next request run
+            conn.execute(table.delete().where(table.c.key == row_key))
+            return
+        conn.execute(table.update().where(table.c.key == row_key).values(
+            status='done',
+            status_code=response.status_code,
+            body=response.get_data(as_text=True),
+            headers=json.dumps({name: response.headers[name] for name in REPLAYED_HEADERS if name in response.headers}),
+            lease_until=None
+        ))
+
+
+def _release(row_key):
+    table = IdempotencyKey.__table__
+    with db.engine.begin() as conn:
+        conn.execute(table.delete().where(table.c.key == row_key, table.c.status == 'in_flight'))
+
+
+def run_once(scope, key, payload, handler):
+    """Return ``handler()``'s response, or the stored response of an earlier request with ``key``.
+
+    Raises KeyConflict if the key was used with a different ``payload`` and
+    KeyInFlight if the first request is still running after
+    IDEMPOTENCY_WAIT_SECONDS.
+    """
+    row_key = _row_key(scope, key)
+    fingerprint = request_hash(payload)
+    deadline = time.monotonic() + IDEMPOTENCY_WAIT_SECONDS
+    row = _claim(row_key, fingerprint)
+    while row is not None:
+        if row.request_hash != fingerprint:
+            raise KeyConflict()
+        if row.status == 'done':
+            return _replay(row)
+        if time.monotonic() >= deadline:
+            raise KeyInFlight()
+        time.sleep(WAIT_POLL_SECONDS)
+        # wait with plain reads; only a released key or an expired lease is worth a write
+        row = _read(row_key)
+        if row is None or (row.status == 'in_flight' and row.lease_until < datetime.utcnow()):
+            row = _claim(row_key, fingerprint)
+
+    try:
+        response = handler()
+    except BaseException:
+        _release(row_key)
+        raise
+    _store(row_key, response)
+    return response
@@ -0,0 +1,197 @@
+"""
+Background execution of slow LLM requests.
+
+An endpoint that is asked to respond asynchronously stores a ``Job`` row and
+returns 202 at once; a small per-process thread pool runs the job and saves
+the response the endpoint would have sent, which stays readable for
+LLM_JOB_RETENTION_SECONDS. Every web worker runs one dispatcher that claims
+jobs from the shared table with a conditional UPDATE, so a job runs once even
+with several gunicorn workers, and jobs left behind by a worker that died are
+picked up again when their lease expires.
+
+Serverless deployments (VERCEL_ENV) have no long-lived process to run jobs,
+so the queue is not started there and endpoints stay synchronous.
+"""
+import json
+import os
+import socket
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, or_, select
+
+from src.models.user import db
+from src.models.job import Job
+from src import llm_scheduler
+
+# concurrent LLM jobs per process
+JOB_WORKERS = int(os.environ.get('LLM_JOB_WORKERS', 2))
+# how long a claimed job may run before another worker may take it over
+JOB_LEASE_SECONDS = int(os.environ.get('LLM_JOB_LEASE_SECONDS', 300))
+JOB_MAX_ATTEMPTS = int(os.environ.get('LLM_JOB_MAX_ATTEMPTS', 2))
+# how often idle dispatchers look for jobs queued by other processes
+JOB_POLL_SECONDS = float(os.environ.get('LLM_JOB_POLL_SECONDS', 1.0))
+# how long finished jobs stay readable at /api/jobs/<id> before they are deleted
+JOB_RETENTION_SECONDS = int(os.environ.get('LLM_JOB_RETENTION_SECONDS', 24 * 3600))
+
+_handlers = {}
+_app = None
+_pid = None
+_pool = None
+_slots = None
+_wake = threading.Event()
+_start_lock = threading.Lock()
+
+
+def register(kind, handler):
+    """Run jobs of ``kind`` with ``handler(payload) -> (body dict, HTTP status)``."""
+    _handlers[kind] = handler
+
+
+def start(app, workers=JOB_WORKERS):
+    """Start this process's dispatcher and worker threads (once per process)."""
+    global _app, _pid, _pool, _slots
+    with _start_lock:
+        if _pid == os.getpid():
+            return
+        _app = app
+        _pid = os.getpid()
+        _pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='llm-job')
+        _slots = threading.Semaphore(workers)
+        threading.Thread(target=_dispatch, name='llm-job-dispatcher', daemon=True).start()
+
+
+def enabled():
+    # threads do not survive a fork, so a forked child needs its own start()
+    return _pid == os.getpid()
+
+
+def _worker_name():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def submit(kind, payload):
+    """Queue a job and wake the dispatcher; returns the committed Job.
+
+    The job keeps the caller's LLM priority: a user waiting on it is still
+    interactive, even though the reply comes back by polling.
+    """
+    _purge_finished()
+    job = Job(id=uuid.uuid4().hex, kind=kind, status='queued', payload=json.dumps(payload),
+              priority=llm_scheduler.current_priority())
+    db.session.add(job)
+    db.session.commit()
+    _wake.set()
+    return job
+
+
+def _purge_finished():
+    """Delete jobs that finished more than JOB_RETENTION_SECONDS ago."""
+    table = Job.__table__
+    cutoff = datetime.utcnow() - timedelta(seconds=JOB_RETENTION_SECONDS)
+    with db.engine.begin() as conn:
+        conn.execute(table.delete().where(
+            table.c.status.in_(('succeeded', 'failed')),
+            table.c.finished_at < cutoff
+        ))
+
+
+def _claimable(table, now):
+    return or_(
+        table.c.status == 'queued',
+        and_(table.c.status == 'running', table.c.lease_until < now)
+    )
+
+
+def _claim():
+    """Atomically take the most urgent, then oldest, runnable job; returns its id or None."""
+    table = Job.__table__
+    now = datetime.utcnow()
+    with db.engine.begin() as conn:
+        candidates = conn.execute(
+            select(table.c.id).where(_claimable(table, now))
+            .order_by(table.c.priority.asc().nulls_last(), table.c.created_at).limit(5)
+        ).scalars().all()
+    for job_id in candidates:
+        with db.engine.begin() as conn:
+            # the WHERE re-checks the state, so only one worker's UPDATE can match
+            claimed = conn.execute(
+                table.update()
+                .where(table.c.id == job_id, _claimable(table, now))
+                .values(
+                    status='running',
+                    worker=_worker_name(),
+                    attempts=table.c.attempts + 1,
+                    started_at=now,
+                    lease_until=now + timedelta(seconds=JOB_LEASE_SECONDS)
+                )
+            ).rowcount
+            if claimed:
+                return job_id
+    return None
+
+
+def _finish(job_id, status, status_code, body, error=None):
+    table = Job.__table__
+    with db.engine.begin() as conn:
+        # skip the write if the lease expired and another worker took the job over
+        conn.execute(
+            table.update()
+            .where(table.c.id == job_id, table.c.status == 'running', table.c.worker == _worker_name())
+            .values(
+                status=status,
+                status_code=status_code,
+                result=json.dumps(body) if body is not None else None,
+                error=error,
+                finished_at=datetime.utcnow(),
+                lease_until=None
+            )
+        )
+
+
+def _run(job_id):
+    try:
+        with _app.app_context():
+            job = db.session.get(Job, job_id)
+            if job.attempts > JOB_MAX_ATTEMPTS:
+                _finish(job_id, 'failed', 500, None, f'Gave up after {JOB_MAX_ATTEMPTS} attempts')
+                return
+            handler = _handlers.get(job.kind)
+            payload = json.loads(job.payload)
+            level = llm_scheduler.BULK if job.priority is None else job.priority
+            db.session.remove()
+            try:
+                if handler is None:
+                    raise ValueError(f'Unknown job kind: {job.kind}')
+                with llm_scheduler.priority(level):
+                    body, status_code = handler(payload)
+            except Exception as e:
+                db.session.rollback()
+                _finish(job_id, 'failed', 500, {'error': str(e)}, str(e))
+                return
+            outcome = 'succeeded' if status_code < 400 else 'failed'
+            _finish(job_id, outcome, status_code, body, body.get('error') if outcome == 'failed' else None)
+    except Exception as e:
+        print(f"⚠️ Job {job_id} could not be completed: {e}")
+    finally:
+        _slots.release()
+        _wake.set()
+
+
+def _dispatch():
+    while True:
+        _slots.acquire()
+        _wake.clear()
+        job_id = None
+        try:
+            with _app.app_context():
+                job_id = _claim()
+        except Exception as e:
+            print(f"⚠️ Job dispatcher could not claim work: {e}")
+        if job_id is None:
+            _slots.release()
+            _wake.wait(JOB_POLL_SECONDS)
+            continue
+        _pool.submit(_run, job_id)
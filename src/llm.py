@@ -1,33 +1,383 @@
 # import libraries
+import hashlib
+import json
 import os
-from openai import OpenAI
+import threading
+import time
+from openai import (OpenAI, DefaultHttpxClient, BadRequestError, RateLimitError,
+                    APIConnectionError, APIStatusError, APITimeoutError)
+import httpx
+from datetime import date
 from dotenv import load_dotenv
+from src import llm_scheduler
+from src import circuit_breaker
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process coalescing
+    fcntl = None
   
 
 
 load_dotenv()  # Loads environment variables from .env 
 
-endpoint = "https://models.github.ai/inference" 
+endpoint = os.environ.get("LLM_ENDPOINT", "https://models.github.ai/inference")
 model = "openai/gpt-4.1-mini" 
 
+# Connection pool, timeouts (seconds) and retries for the inference endpoint
+LLM_MAX_CONNECTIONS = int(os.environ.get("LLM_MAX_CONNECTIONS", 10))
+LLM_KEEPALIVE_EXPIRY = float(os.environ.get("LLM_KEEPALIVE_EXPIRY", 60))
+LLM_CONNECT_TIMEOUT = float(os.environ.get("LLM_CONNECT_TIMEOUT", 5))
+LLM_TIMEOUT = float(os.environ.get("LLM_TIMEOUT", 60))
+# the SDK retries connection errors, 429s and 5xx with exponential backoff
+LLM_MAX_RETRIES = int(os.environ.get("LLM_MAX_RETRIES", 2))
+
+# Directory for lock files that coalesce identical calls across worker
+# processes on this host; unset means threads of one process only
+LLM_SINGLEFLIGHT_DIR = os.environ.get("LLM_SINGLEFLIGHT_DIR")
+# lock files of calls older than this (seconds) are removed
+LLM_SINGLEFLIGHT_TTL = float(os.environ.get("LLM_SINGLEFLIGHT_TTL", 600))
+# how often (seconds) a process waiting for another's identical call checks the lock
+LOCK_POLL_INTERVAL = 0.05
+
+_client = None
+_client_key = None
+_client_lock = threading.Lock()
+
+_stats_lock = threading.Lock()
+_stats = {"calls": 0, "errors": 0, "first_call_ms": None, "last_call_ms": None,
+          "max_call_ms": 0.0, "total_call_ms": 0.0,
+          # calls answered by another identical in-flight call instead of the endpoint
+          "coalesced": 0, "coalesced_across_processes": 0}
+
+_flights = {}
+_flights_lock = threading.Lock()
+_last_prune = 0.0
+
+
+def get_client():
+    """Return this process's OpenAI client, creating it on first use.
+
+    The client keeps its HTTP connections alive between calls, so only the
+    first call pays for the TCP/TLS handshake. It is rebuilt after a fork
+    (each gunicorn worker needs its own sockets) or when the token changes.
+    """
+    global _client, _client_key
+    # Retrieve token at runtime instead of module import time
+    token = os.environ.get("GITHUB_TOKEN")
+    if not token:
+        raise ValueError(
+            "GITHUB_TOKEN environment variable is required but not set. "
+            "Please add it to your .env file (local) or Vercel Environment Variables (production)."
+        )
+    key = (os.getpid(), token, endpoint)
+    with _client_lock:
+        if _client_key != key:
+            timeout = httpx.Timeout(LLM_TIMEOUT, connect=LLM_CONNECT_TIMEOUT)
+            _client = OpenAI(
+                base_url=endpoint,
+                api_key=token,
+                timeout=timeout,
+                max_retries=LLM_MAX_RETRIES,
+                http_client=DefaultHttpxClient(
+                    timeout=timeout,
+                    limits=httpx.Limits(
+                        max_connections=LLM_MAX_CONNECTIONS,
+                        max_keepalive_connections=LLM_MAX_CONNECTIONS,
+                        keepalive_expiry=LLM_KEEPALIVE_EXPIRY,
+                    ),
+                ),
+            )
+            _client_key = key
+        return _client
+
+
+def _record_call(elapsed_ms, failed):
+    with _stats_lock:
+        _stats["calls"] += 1
+        if failed:
+            _stats["errors"] += 1
+        if _stats["first_call_ms"] is None:
+            _stats["first_call_ms"] = round(elapsed_ms, 1)
+        _stats["last_call_ms"] = round(elapsed_ms, 1)
+        _stats["max_call_ms"] = max(_stats["max_call_ms"], round(elapsed_ms, 1))
+        _stats["total_call_ms"] += elapsed_ms
+
+
+def _count(name):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def llm_stats():
+    """Call counts and latencies (ms) for this process; the first call includes connection setup."""
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["avg_call_ms"] = round(stats["total_call_ms"] / stats["calls"], 1) if stats["calls"] else None
+    stats["total_call_ms"] = round(stats["total_call_ms"], 1)
+    return stats
+
+
+class _Flight:
+    """One upstream call that identical concurrent callers wait on."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+def _flight_key(model, messages, temperature, top_p, response_format):
+    request = json.dumps([model, messages, temperature, top_p, response_format], sort_keys=True)
+    return hashlib.sha256(request.encode("utf-8")).hexdigest()
+
+
+def _call_across_processes(key, call):
+    """Run ``call`` unless another process on this host is making the same call.
+
+    Callers serialise on a per-key lock file; the one holding the lock makes
+    the call and leaves the reply in the file with its finish time, so
+    callers that were waiting for the lock use that reply instead of calling
+    again. Errors are not shared: a waiter that finds no fresh reply calls
+    the endpoint itself. Waiting for the lock is bounded by the thread's
+    deadline (Overloaded when it runs out), so a wedged holder cannot park
+    the other workers.
+    """
+    os.makedirs(LLM_SINGLEFLIGHT_DIR, exist_ok=True)
+    path = os.path.join(LLM_SINGLEFLIGHT_DIR, f"{key}.lock")
+    waiting_since = time.time()
+    with open(path, "a+", encoding="utf-8") as lock_file:
+        _lock_before_deadline(lock_file)
+        try:
+            lock_file.seek(0)
+            try:
+                previous = json.loads(lock_file.read() or "null")
+            except ValueError:
+                previous = None
+            if previous and previous["finished_at"] >= waiting_since:
+                _count("coalesced_across_processes")
+                return previous["content"]
+            content = call()
+            lock_file.seek(0)
+            lock_file.truncate()
+            lock_file.write(json.dumps({"finished_at": time.time(), "content": content}))
+            lock_file.flush()
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+    _prune_lock_files()
+    return content
+
+
+def _lock_before_deadline(lock_file):
+    """Take the exclusive lock on ``lock_file``, polling until the thread's deadline.
+
+    Without a deadline, wait as long as the holder's call can take, SDK retries included.
+    """
+    left = llm_scheduler.remaining()
+    if left is None:
+        left = LLM_TIMEOUT * (LLM_MAX_RETRIES + 1)
+    give_up = time.monotonic() + left
+    while True:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return
+        except BlockingIOError:
+            now = time.monotonic()
+            if now >= give_up:
+                raise _unavailable(timed_out=True)
+            time.sleep(min(LOCK_POLL_INTERVAL, give_up - now))
+
+
+def _prune_lock_files():
+    # a file removed while another process waits on it only costs that
+    # process a duplicate call, never a wrong reply
+    global _last_prune
+    now = time.time()
+    if now - _last_prune < LLM_SINGLEFLIGHT_TTL / 10:
+        return
+    _last_prune = now
+    cutoff = now - LLM_SINGLEFLIGHT_TTL
+    try:
+        with os.scandir(LLM_SINGLEFLIGHT_DIR) as entries:
+            for entry in entries:
+                if entry.name.endswith(".lock") and entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+    except OSError:
+        pass
+
+
 # A function to call an LLM model and return the response 
 
-def call_llm_model(model, messages, temperature=1.0, top_p=1.0):
-	# Retrieve token at runtime instead of module import time
-	token = os.environ.get("GITHUB_TOKEN")
-	if not token:
-		raise ValueError(
-			"GITHUB_TOKEN environment variable is required but not set. "
-			"Please add it to your .env file (local) or Vercel Environment Variables (production)."
-		)
-	client = OpenAI(base_url=endpoint,api_key=token) 
-	response = client.chat.completions.create( 
-		messages=messages, 
-		temperature=temperature, top_p=top_p, model=model) 
+def call_llm_model(model, messages, temperature=1.0, top_p=1.0, response_format=None):
+	"""Return the model's reply; identical concurrent calls share one request.
+
+	Calls with the same model, messages and sampling parameters that arrive
+	while one is in flight wait for it and get its reply (or its exception),
+	so several tabs translating the same note cost one completion.
+	"""
+	key = _flight_key(model, messages, temperature, top_p, response_format)
+	with _flights_lock:
+		flight = _flights.get(key)
+		leader = flight is None
+		if leader:
+			flight = _flights[key] = _Flight()
+	if not leader:
+		_count("coalesced")
+		if not flight.done.wait(llm_scheduler.remaining()):
+			raise _unavailable(timed_out=True)
+		if flight.error is not None:
+			raise flight.error
+		return flight.result
+
+	call = lambda: _call_upstream(model, messages, temperature, top_p, response_format)
+	try:
+		if LLM_SINGLEFLIGHT_DIR and fcntl is not None:
+			flight.result = _call_across_processes(key, call)
+		else:
+			flight.result = call()
+		return flight.result
+	except Exception as e:
+		flight.error = e
+		raise
+	finally:
+		with _flights_lock:
+			del _flights[key]
+		flight.done.set()
+
+
+def _retry_after(error):
+	try:
+		return float(error.response.headers.get("retry-after"))
+	except (AttributeError, TypeError, ValueError):
+		return None
+
+
+def _rate_limited(slot, error):
+	"""Tell the scheduler about a 429 and turn it into Overloaded for the routes."""
+	retry_after = _retry_after(error)
+	slot.throttled(retry_after)
+	return llm_scheduler.Overloaded(
+		"The language model's rate limit was reached, please try again shortly",
+		retry_after=retry_after or llm_scheduler.LLM_RATE_LIMIT_PAUSE, status_code=429)
+
+
+def _unavailable(timed_out):
+	"""Overloaded (503) for a call the endpoint did not answer, in time or at all."""
+	if timed_out:
+		message = "The language model did not answer in time, please try again shortly"
+	else:
+		message = "The language model is unavailable, please try again shortly"
+	return llm_scheduler.Overloaded(message, retry_after=5)
+
+
+def _bounded(client):
+	"""The client limited to the time left before this thread's deadline, if it has one.
+
+	Also returns whether that cut the usual LLM_TIMEOUT short.
+	"""
+	left = llm_scheduler.remaining()
+	if left is None:
+		return client, False
+	# one attempt only: SDK retries would run past the deadline
+	return client.with_options(timeout=max(left, 0.1), max_retries=0), left < LLM_TIMEOUT
+
+
+def _call_upstream(model, messages, temperature, top_p, response_format):
+	breaker = circuit_breaker.get(model)
+	breaker.before_call()
+	# None until the endpoint is called, then whether it failed to answer
+	down = None
+	elapsed = 0.0
+	try:
+		with llm_scheduler.slot(model, messages) as slot:
+			# timed from before get_client() so the first call's figure includes client setup
+			start = time.perf_counter()
+			failed = True
+			try:
+				client, truncated = _bounded(get_client())
+				options = {"response_format": response_format} if response_format else {}
+				down = True
+				response = client.chat.completions.create( 
+					messages=messages, 
+					temperature=temperature, top_p=top_p, model=model, **options) 
+				down = failed = False
+			except APIStatusError as e:
+				# the endpoint answered; only a 5xx says it is unwell
+				down = e.status_code >= 500
+				if isinstance(e, RateLimitError):
+					raise _rate_limited(slot, e) from e
+				if down:
+					raise _unavailable(timed_out=False) from e
+				raise
+			except APIConnectionError as e:
+				timed_out = isinstance(e, APITimeoutError)
+				if timed_out and truncated:
+					# our deadline cut the call short; that says nothing about the endpoint
+					down = None
+				raise _unavailable(timed_out) from e
+			finally:
+				elapsed = time.perf_counter() - start
+				_record_call(elapsed * 1000, failed)
+			if response.usage is not None:
+				slot.used(response.usage.total_tokens)
+	finally:
+		if down is None:
+			breaker.cancel()
+		else:
+			breaker.record(down, elapsed)
 	return response.choices[0].message.content 
 
 
-def translate_to_language(text, target_language):
+def stream_llm_model(model, messages, temperature=1.0, top_p=1.0):
+    """Like call_llm_model, but yield the reply's text as the model produces it.
+
+    Closing the generator (e.g. when the browser disconnects) closes the
+    upstream HTTP stream, so the model stops generating for nobody.
+    """
+    breaker = circuit_breaker.get(model)
+    breaker.before_call()
+    down = None
+    try:
+        with llm_scheduler.slot(model, messages) as slot:
+            start = time.perf_counter()
+            failed = True
+            stream = None
+            try:
+                down = True
+                stream = get_client().chat.completions.create(
+                    messages=messages,
+                    temperature=temperature, top_p=top_p, model=model, stream=True)
+                down = False
+                for chunk in stream:
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        yield chunk.choices[0].delta.content
+                failed = False
+            except GeneratorExit:
+                # the consumer went away; that is a cancellation, not an LLM failure
+                failed = False
+                raise
+            except APIStatusError as e:
+                down = e.status_code >= 500
+                if isinstance(e, RateLimitError):
+                    raise _rate_limited(slot, e) from e
+                if down:
+                    raise _unavailable(timed_out=False) from e
+                raise
+            except APIConnectionError as e:
+                down = True
+                raise _unavailable(isinstance(e, APITimeoutError)) from e
+            finally:
+                if stream is not None:
+                    stream.close()
+                _record_call((time.perf_counter() - start) * 1000, failed)
+    finally:
+        if down is None:
+            breaker.cancel()
+        else:
+            # a long reply is not a slow endpoint, so the stream's duration is not counted
+            breaker.record(down, 0.0)
+
+
+def _translation_messages(text, target_language):
     # Use a deterministic, instruction-focused prompt to avoid clarification questions
     prompt = (
         f"You are a professional translator. Translate the following text into {target_language}.\n"
@@ -35,10 +385,59 @@ def translate_to_language(text, target_language):
         "If the input is empty, return an empty string.\n\n"
         f"Text:\n{text}"
     )
-    messages = [{"role": "user", "content": prompt}]
+    return [{"role": "user", "content": prompt}]
+
+
+def translate_to_language(text, target_language):
+    messages = _translation_messages(text, target_language)
     # Use low temperature for deterministic translations and reduce chance of clarifying questions
     return call_llm_model(model, messages, temperature=0.2, top_p=1.0)
 
+
+def stream_translation(text, target_language):
+    """translate_to_language() as a generator of text pieces."""
+    return stream_llm_model(model, _translation_messages(text, target_language), temperature=0.2, top_p=1.0)
+
+def _strip_code_fence(reply):
+    # some models wrap JSON in ```json fences even when asked not to
+    reply = (reply or "").strip()
+    if reply.startswith("```"):
+        reply = reply.split("\n", 1)[1] if "\n" in reply else ""
+        reply = reply.rsplit("```", 1)[0]
+    return reply.strip()
+
+
+class UnusableTranslation(Exception):
+    """The model's combined translation reply cannot be split back into fields."""
+
+
+def translate_fields(fields, target_language):
+    """Translate several texts in one round trip; ``fields`` maps names to texts.
+
+    The model answers with a JSON object with the same keys, so the result
+    splits reliably. Raises UnusableTranslation if the reply is not such an object.
+    """
+    prompt = (
+        f"You are a professional translator. Translate every value of the JSON object below into {target_language}.\n"
+        "Return only a JSON object with exactly the same keys and the translated strings as values "
+        "(no explanations, no questions, no extra markup). Keep line breaks and formatting within each value.\n\n"
+        f"{json.dumps(fields, ensure_ascii=False)}"
+    )
+    messages = [{"role": "user", "content": prompt}]
+    try:
+        reply = call_llm_model(model, messages, temperature=0.2, top_p=1.0,
+                               response_format={"type": "json_object"})
+    except BadRequestError as e:
+        raise UnusableTranslation(f"structured output not supported: {e}")
+    try:
+        translated = json.loads(_strip_code_fence(reply))
+    except json.JSONDecodeError:
+        raise UnusableTranslation("translation reply is not JSON")
+    if (not isinstance(translated, dict) or set(translated) != set(fields)
+            or not all(isinstance(value, str) for value in translated.values())):
+        raise UnusableTranslation("translation reply does not have the requested fields")
+    return translated
+
 system_prompt = '''
 Extract the user's notes into the following structured fields: 
 1. Title: A concise title of the notes less than 5 words 
@@ -48,10 +447,10 @@ Extract the user's notes into the following structured fields:
    - Relative dates: "tmr"/"tomorrow" = next day, "后天"/"day after tomorrow" = day after next, "下周一"/"next monday" = calculate next monday
    - Short dates: "11.2" or "11/2" = "2025-11-02" (current year), "3.15" = "2025-03-15" 
    - Full dates: "2025-12-25" = keep as is
-   - Today's date is 2025-10-24. If no date mentioned, return null.
+   - Today's date is {today}. If no date mentioned, return null.
 5. Time: Extract the time in HH:MM format (24-hour) if mentioned. Convert "5pm"="17:00", "上午9点"="09:00". If no time mentioned, return null.
 Output in JSON format without ```json. Output title and notes in the language: {lang}. 
-Examples: 
+Examples (written for today = 2025-10-24): 
 Input: "Badminton tmr 5pm @polyu" → Date: "2025-10-25", Time: "17:00"
 Input: "会议 11.2 下午3点" → Date: "2025-11-02", Time: "15:00"  
 Input: "后天上午开会" → Date: "2025-10-26", Time: null
@@ -66,9 +465,35 @@ Output format: {{
 
 # a funtion to extract structured notes using llm
 
-def extract_structured_notes(text, lang ="English"):
-    prompt = f"extract the user's notes into structured fields in {lang}.\n" 
-    messages = [{"role": "system", "content": system_prompt.format(lang=lang)},
+# shorter prompt used when src/quick_extract.py already found the date and/or time
+hinted_prompt = '''
+Extract the user's notes into the following structured fields: 
+1. Title: A concise title of the notes less than 5 words 
+2. Notes: The notes based on user input written in full sentences. 
+3. Tags (A list): At most 3 Keywords or tags that categorize the content of the notes. 
+4. Date: {date_rule}
+5. Time: {time_rule}
+Output in JSON format without ```json. Output title and notes in the language: {lang}. 
+Output format: {{"Title": "...", "Notes": "...", "Tags": ["tag1", "tag2"], "Date": "YYYY-MM-DD" or null, "Time": "HH:MM" or null}}
+'''
+
+
+def _hint_rule(value, field, fmt):
+    if value:
+        return f'"{value}" (already resolved from the input; return it unchanged)'
+    return f"The {field} in {fmt} format if one is mentioned, else null."
+
+
+def extract_structured_notes(text, lang ="English", hints=None):
+    if hints:
+        content = hinted_prompt.format(
+            lang=lang,
+            date_rule=_hint_rule(hints.get("date"), "date", "YYYY-MM-DD"),
+            time_rule=_hint_rule(hints.get("time"), "time", "HH:MM (24-hour)"),
+        )
+    else:
+        content = system_prompt.format(lang=lang, today=date.today().isoformat())
+    messages = [{"role": "system", "content": content},
                 {"role": "user", "content": text}
                 ]
     response = call_llm_model(model, messages)
@@ -0,0 +1,298 @@
+"""
+Client-side scheduling of calls to the inference endpoint.
+
+The hosted endpoint limits requests and tokens per minute and answers bursts
+over the quota with 429s. Every call first takes a slot here: a per-model
+token bucket for requests and one for (estimated) tokens keep the call rate
+under the quota, and calls that would exceed it wait in a queue where
+interactive requests go before background jobs. The number of concurrent
+calls adapts like TCP congestion control (AIMD): it grows by one per window
+of successful calls and halves on a 429 or a very slow call, and a 429's
+Retry-After pauses the model's queue. A call that cannot start within its
+queue timeout raises Overloaded, which routes turn into 503 + Retry-After
+(429 when the endpoint itself rejected the call).
+
+The limits are the deployment's whole quota; the defaults fit GitHub Models'
+low tier (gpt-4.1-mini: 15 requests/minute, 5 concurrent). Each process
+schedules on its own, so it takes a 1/WEB_CONCURRENCY share of every limit
+(the Procfile sets WEB_CONCURRENCY to gunicorn's worker count).
+"""
+import heapq
+import itertools
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+INTERACTIVE = 0
+BULK = 1
+
+# number of processes sharing the quota; gunicorn also reads it as its worker count
+WEB_CONCURRENCY = max(1, int(os.environ.get('WEB_CONCURRENCY', 1)))
+LLM_REQUESTS_PER_MINUTE = float(os.environ.get('LLM_REQUESTS_PER_MINUTE', 15))
+# 0 disables the token bucket
+LLM_TOKENS_PER_MINUTE = float(os.environ.get('LLM_TOKENS_PER_MINUTE', 40000))
+# how many seconds of quota may be spent at once; 60 lets a minute's worth go in a burst
+LLM_BURST_SECONDS = float(os.environ.get('LLM_BURST_SECONDS', 60))
+LLM_MAX_CONCURRENCY = int(os.environ.get('LLM_MAX_CONCURRENCY', 5))
+# how long a call may wait for a slot (seconds) before giving up
+LLM_QUEUE_TIMEOUT = float(os.environ.get('LLM_QUEUE_TIMEOUT', 20))
+LLM_BULK_QUEUE_TIMEOUT = float(os.environ.get('LLM_BULK_QUEUE_TIMEOUT', 300))
+# total time a synchronous request may spend on LLM calls, queueing included
+LLM_DEADLINE = float(os.environ.get('LLM_DEADLINE', 25))
+# a call is not started with less than this left before the deadline; the
+# queue wait stops early enough to leave it
+LLM_MIN_CALL_SECONDS = float(os.environ.get('LLM_MIN_CALL_SECONDS', 3))
+# pause after a 429 that carries no Retry-After
+LLM_RATE_LIMIT_PAUSE = float(os.environ.get('LLM_RATE_LIMIT_PAUSE', 10))
+# a call slower than this counts as congestion, like a 429 without the pause
+LLM_SLOW_CALL_SECONDS = float(os.environ.get('LLM_SLOW_CALL_SECONDS', 30))
+
+
+class Overloaded(Exception):
+    """The call could not be made now; retry after ``retry_after`` seconds."""
+
+    def __init__(self, message, retry_after, status_code=503):
+        super().__init__(message)
+        self.retry_after = max(1, int(math.ceil(retry_after)))
+        self.status_code = status_code
+
+
+def estimate_tokens(messages):
+    """Rough token count of a prompt: ~4 characters per token, 1 per CJK character."""
+    tokens = 0
+    for message in messages:
+        text = message.get('content') or ''
+        wide = sum(1 for ch in text if ord(ch) >= 0x2E80)
+        tokens += 4 + wide + (len(text) - wide + 3) // 4
+    return tokens
+
+
+class _TokenBucket:
+    def __init__(self, per_minute):
+        self.rate = per_minute / 60.0
+        self.capacity = max(1.0, self.rate * LLM_BURST_SECONDS)
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def cost(self, amount):
+        # a call bigger than the whole bucket waits for a full bucket, not forever
+        return min(amount, self.capacity)
+
+    def delay(self, amount, now):
+        """Seconds until ``amount`` can be taken; 0 if it can be taken now."""
+        if self.rate <= 0:
+            return 0.0
+        self._refill(now)
+        missing = self.cost(amount) - self.level
+        return missing / self.rate if missing > 0 else 0.0
+
+    def take(self, amount):
+        if self.rate > 0:
+            self.level -= self.cost(amount)
+
+    def adjust(self, amount):
+        """Give back (positive) or charge (negative) tokens after the fact."""
+        if self.rate > 0:
+            self.level = min(self.capacity, self.level + amount)
+
+
+class _ModelQueue:
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.requests = _TokenBucket(LLM_REQUESTS_PER_MINUTE / WEB_CONCURRENCY)
+        self.tokens = _TokenBucket(LLM_TOKENS_PER_MINUTE / WEB_CONCURRENCY)
+        self.max_concurrency = max(1.0, float(LLM_MAX_CONCURRENCY // WEB_CONCURRENCY))
+        self.limit = self.max_concurrency
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self.waiting = []
+        self.counts = {'calls': 0, 'rate_limited': 0, 'slow': 0, 'rejected': 0, 'queued': 0}
+        self.total_wait = 0.0
+
+    def _delay(self, tokens, now):
+        return max(self.paused_until - now, self.requests.delay(1, now), self.tokens.delay(tokens, now))
+
+    def acquire(self, tokens, priority, timeout):
+        ticket = (priority, next(_tickets))
+        start = time.monotonic()
+        deadline = start + timeout
+        with self.condition:
+            heapq.heappush(self.waiting, ticket)
+            try:
+                while True:
+                    now = time.monotonic()
+                    delay = self._delay(tokens, now)
+                    if self.waiting[0] == ticket and self.in_flight < int(self.limit) and delay <= 0:
+                        self.requests.take(1)
+                        self.tokens.take(tokens)
+                        self.in_flight += 1
+                        self.counts['calls'] += 1
+                        if now - start > 0.001:
+                            self.counts['queued'] += 1
+                            self.total_wait += now - start
+                        return
+                    if now >= deadline or now + delay > deadline:
+                        self.counts['rejected'] += 1
+                        raise Overloaded('The language model is busy, please try again shortly',
+                                         retry_after=max(delay, 1))
+                    # woken early by a release; otherwise when the buckets refill
+                    self.condition.wait(min(deadline - now, delay or deadline - now))
+            finally:
+                self.waiting.remove(ticket)
+                heapq.heapify(self.waiting)
+                self.condition.notify_all()
+
+    def release(self, tokens, used_tokens, elapsed, failed, rate_limited, retry_after):
+        with self.condition:
+            self.in_flight -= 1
+            if used_tokens is not None:
+                self.tokens.adjust(self.tokens.cost(tokens) - used_tokens)
+            if rate_limited:
+                self.counts['rate_limited'] += 1
+                self.limit = max(1.0, self.limit / 2)
+                pause = retry_after if retry_after is not None else LLM_RATE_LIMIT_PAUSE
+                self.paused_until = max(self.paused_until, time.monotonic() + pause)
+            elif elapsed > LLM_SLOW_CALL_SECONDS:
+                self.counts['slow'] += 1
+                self.limit = max(1.0, self.limit / 2)
+            elif not failed:
+                # additive increase: +1 after `limit` successful calls
+                self.limit = min(self.max_concurrency, self.limit + 1 / self.limit)
+            self.condition.notify_all()
+
+    def stats(self):
+        with self.condition:
+            now = time.monotonic()
+            self.requests._refill(now)
+            self.tokens._refill(now)
+            stats = dict(self.counts)
+            stats.update(
+                concurrency_limit=int(self.limit),
+                in_flight=self.in_flight,
+                waiting=len(self.waiting),
+                requests_available=round(self.requests.level, 1),
+                tokens_available=round(self.tokens.level) if self.tokens.rate > 0 else None,
+                paused_for_s=round(max(0.0, self.paused_until - now), 1),
+                avg_wait_ms=round(self.total_wait / stats['queued'] * 1000, 1) if stats['queued'] else None,
+            )
+            return stats
+
+
+class _Slot:
+    """Handle for a running call; report what the endpoint said through it."""
+
+    def __init__(self):
+        self.used_tokens = None
+        self.rate_limited = False
+        self.retry_after = None
+
+    def used(self, total_tokens):
+        self.used_tokens = total_tokens
+
+    def throttled(self, retry_after=None):
+        self.rate_limited = True
+        self.retry_after = retry_after
+
+
+_tickets = itertools.count()
+_queues = {}
+_queues_lock = threading.Lock()
+_local = threading.local()
+
+
+def _queue(model):
+    with _queues_lock:
+        if model not in _queues:
+            _queues[model] = _ModelQueue()
+        return _queues[model]
+
+
+def current_priority():
+    return getattr(_local, 'priority', INTERACTIVE)
+
+
+def remaining():
+    """Seconds left before this thread's deadline, or None without one."""
+    deadline = getattr(_local, 'deadline', None)
+    return None if deadline is None else deadline - time.monotonic()
+
+
+@contextmanager
+def priority(level):
+    """Run the calls made by this thread inside the block at ``level``."""
+    previous = current_priority()
+    _local.priority = level
+    try:
+        yield
+    finally:
+        _local.priority = previous
+
+
+@contextmanager
+def deadline(seconds=None):
+    """Give the calls made by this thread inside the block ``seconds`` in total (default LLM_DEADLINE)."""
+    previous = getattr(_local, 'deadline', None)
+    until = time.monotonic() + (LLM_DEADLINE if seconds is None else seconds)
+    _local.deadline = until if previous is None else min(previous, until)
+    try:
+        yield
+    finally:
+        _local.deadline = previous
+
+
+def current_context():
+    """This thread's priority and deadline, to hand to worker threads with using()."""
+    return current_priority(), getattr(_local, 'deadline', None)
+
+
+@contextmanager
+def using(context):
+    previous = current_context()
+    _local.priority, _local.deadline = context
+    try:
+        yield
+    finally:
+        _local.priority, _local.deadline = previous
+
+
+@contextmanager
+def slot(model, messages):
+    """Wait for permission to call ``model`` with ``messages``, then hold it for the block.
+
+    Raises Overloaded if no slot frees up within the queue timeout of the
+    current priority, or in time to leave LLM_MIN_CALL_SECONDS for the call
+    before the thread's deadline.
+    """
+    level = current_priority()
+    timeout = LLM_BULK_QUEUE_TIMEOUT if level == BULK else LLM_QUEUE_TIMEOUT
+    left = remaining()
+    if left is not None:
+        timeout = min(timeout, left - LLM_MIN_CALL_SECONDS)
+        if timeout < 0:
+            raise Overloaded('The language model is busy, please try again shortly', retry_after=1)
+    # the reply is charged up front as long as the prompt, then corrected from usage
+    tokens = 2 * estimate_tokens(messages)
+    queue = _queue(model)
+    queue.acquire(tokens, level, timeout)
+    handle = _Slot()
+    start = time.monotonic()
+    failed = True
+    try:
+        yield handle
+        failed = False
+    finally:
+        queue.release(tokens, handle.used_tokens, time.monotonic() - start, failed,
+                      handle.rate_limited, handle.retry_after)
+
+
+def stats():
+    """Per-model queue state and counters for this process."""
+    with _queues_lock:
+        queues = dict(_queues)
+    return {model: queue.stats() for model, queue in queues.items()}
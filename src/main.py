@@ -6,7 +6,7 @@ from pathlib import Path
 project_root = Path(__file__).parent.parent
 sys.path.insert(0, str(project_root))
 
-from flask import Flask, send_from_directory, jsonify
+from flask import Flask, jsonify, request
 from flask_cors import CORS
 
 # Flexible imports for different environments
@@ -14,14 +14,36 @@ try:
     from src.models.user import db
     from src.routes.user import user_bp
     from src.routes.note import note_bp
-    from src.models.note import Note
+    from src.routes.job import job_bp
+    from src.models.note import Note, json_fragments
+    from src.models.schema import ensure_schema
+    from src import response_cache
+    from src.static_assets import StaticAssets
+    from src.compression import compress_response
+    from src.llm import llm_stats
+    from src.models.translation import translations
+    from src import jobs
+    from src import quick_extract
+    from src import llm_scheduler
+    from src import circuit_breaker
 except ImportError:
     # Fallback for Vercel environment
     sys.path.insert(0, str(Path(__file__).parent))
     from models.user import db
     from routes.user import user_bp
     from routes.note import note_bp
-    from models.note import Note
+    from routes.job import job_bp
+    from models.note import Note, json_fragments
+    from models.schema import ensure_schema
+    import response_cache
+    from static_assets import StaticAssets
+    from compression import compress_response
+    from llm import llm_stats
+    from models.translation import translations
+    import jobs
+    import quick_extract
+    import llm_scheduler
+    import circuit_breaker
 from flask_migrate import Migrate
 from dotenv import load_dotenv
 
@@ -33,9 +55,18 @@ app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'asdf#FGSgvasgf$5$WGT')
 # Enable CORS for all routes
 CORS(app)
 
+# Compress large API responses (set COMPRESS_RESPONSES=0 when a proxy already does)
+if os.environ.get('COMPRESS_RESPONSES', '1') != '0':
+    @app.after_request
+    def compress(response):
+        if request.method == 'HEAD':
+            return response
+        return compress_response(response, request.accept_encodings)
+
 # Register blueprints
 app.register_blueprint(user_bp, url_prefix='/api')
 app.register_blueprint(note_bp, url_prefix='/api')
+app.register_blueprint(job_bp, url_prefix='/api')
 
 # Database configuration - smart environment detection
 VERCEL_ENV = os.environ.get('VERCEL_ENV')  # Vercel sets this automatically
@@ -82,12 +113,33 @@ else:
         print(f"🗄️  Using in-memory SQLite database (fallback due to read-only FS)")
 
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+
+# Optional response cache shared by all workers on this host (see src/response_cache.py).
+# RESPONSE_CACHE=1 keeps it next to the local database; any other value is a file path.
+RESPONSE_CACHE = os.environ.get('RESPONSE_CACHE')
+if RESPONSE_CACHE and not VERCEL_ENV:
+    cache_path = RESPONSE_CACHE
+    if RESPONSE_CACHE == '1':
+        cache_dir = os.path.join(os.path.abspath(os.path.dirname(os.path.dirname(__file__))), 'database')
+        os.makedirs(cache_dir, exist_ok=True)
+        cache_path = os.path.join(cache_dir, 'response_cache.db')
+    response_cache.configure(
+        cache_path,
+        max_bytes=int(os.environ.get('RESPONSE_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+    )
+    print(f"🗃️  Shared response cache enabled at {cache_path}")
+
 db.init_app(app)
 
 # Initialize migrations
 migrate = Migrate(app, db)
 with app.app_context():
     db.create_all()
+    ensure_schema()
+
+# Background LLM jobs need a long-lived process, so serverless mode stays synchronous
+if not VERCEL_ENV and os.environ.get('LLM_JOBS', '1') != '0':
+    jobs.start(app)
 
 
 @app.route('/api/health')
@@ -117,24 +169,30 @@ def health():
     return jsonify({
         'status': 'ok',
         'db_mode': mode,
-        'db_uri': masked
+        'db_uri': masked,
+        'serialization_cache': json_fragments.stats(),
+        'response_cache': response_cache.stats(),
+        'translation_cache': translations.stats(),
+        'llm': llm_stats(),
+        'llm_scheduler': llm_scheduler.stats(),
+        'llm_circuit_breaker': circuit_breaker.stats(),
+        'quick_extract': quick_extract.stats()
     })
 
+# Frontend files are loaded (and precompressed) once at startup
+static_assets = StaticAssets(app.static_folder)
+
+
 @app.route('/', defaults={'path': ''})
 @app.route('/<path:path>')
 def serve(path):
-    static_folder_path = app.static_folder
-    if static_folder_path is None:
-            return "Static folder not configured", 404
-
-    if path != "" and os.path.exists(os.path.join(static_folder_path, path)):
-        return send_from_directory(static_folder_path, path)
-    else:
-        index_path = os.path.join(static_folder_path, 'index.html')
-        if os.path.exists(index_path):
-            return send_from_directory(static_folder_path, 'index.html')
-        else:
-            return "index.html not found", 404
+    asset = static_assets.get(path) if path else None
+    if asset is None:
+        # unknown paths fall back to the single-page app shell
+        asset = static_assets.get('index.html')
+    if asset is None:
+        return "index.html not found", 404
+    return asset.response()
 
 
 if __name__ == '__main__':
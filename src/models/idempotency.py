@@ -0,0 +1,26 @@
+"""Stored responses for requests sent with an ``Idempotency-Key`` (see src/idempotency.py).
+
+A row is created ``in_flight`` when the first request with a key starts and
+holds its response once it is done, until ``expires_at``.
+"""
+from datetime import datetime
+from src.models.user import db
+
+
+class IdempotencyKey(db.Model):
+    # sha256 of the endpoint and the client's key
+    key = db.Column(db.String(64), primary_key=True)
+    # sha256 of the request body, to refuse a key reused for a different request
+    request_hash = db.Column(db.String(64), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='in_flight')
+    status_code = db.Column(db.Integer, nullable=True)
+    body = db.Column(db.Text, nullable=True)
+    # JSON object of the response headers worth replaying (e.g. Location)
+    headers = db.Column(db.Text, nullable=True)
+    # an in-flight key whose lease has passed is assumed abandoned and may be retried
+    lease_until = db.Column(db.DateTime, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+    def __repr__(self):
+        return f'<IdempotencyKey {self.key[:12]} {self.status}>'
@@ -0,0 +1,51 @@
+"""Background LLM jobs (see src/jobs.py).
+
+Rows are the queue: workers claim ``queued`` jobs with a conditional UPDATE,
+hold them under a lease while they run, and store the HTTP status and JSON
+body the synchronous endpoint would have returned.
+"""
+import json
+from datetime import datetime
+from src.models.user import db
+
+STATUSES = ('queued', 'running', 'succeeded', 'failed')
+
+
+class Job(db.Model):
+    id = db.Column(db.String(32), primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='queued')
+    payload = db.Column(db.Text, nullable=False)
+    result = db.Column(db.Text, nullable=True)
+    status_code = db.Column(db.Integer, nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    worker = db.Column(db.String(100), nullable=True)
+    # llm_scheduler priority of the request that queued the job (NULL: older rows, run as BULK)
+    priority = db.Column(db.Integer, nullable=True)
+    # a running job whose lease has passed is assumed lost and is run again
+    lease_until = db.Column(db.DateTime, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (
+        db.Index('ix_job_status_created', 'status', 'created_at'),
+    )
+
+    def __repr__(self):
+        return f'<Job {self.id} {self.kind} {self.status}>'
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'status_code': self.status_code,
+            'result': json.loads(self.result) if self.result else None,
+            'error': self.error,
+            'attempts': self.attempts,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
@@ -1,6 +1,31 @@
+import os
+import threading
+from flask import current_app, has_app_context
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime, date, time
+from sqlalchemy import func, event, select, bindparam
+from sqlalchemy.orm import Session
 from src.models.user import db
+from src.ordering import evenly_spaced_keys, keys_before, REBALANCE_KEY_LENGTH
+from src.lru import LRUCache
+from src import response_cache
+
+# characters of content returned as the sidebar preview in the summary view
+PREVIEW_LENGTH = 120
+
+# pre-encoded JSON per (view, note id); an entry is only used while the
+# note's updated_at still matches, since every write bumps updated_at
+json_fragments = LRUCache(int(os.environ.get('NOTE_JSON_CACHE_SIZE', 10000)))
+
+
+def _cached_json(kind, row, serialize):
+    key = (kind, row.id)
+    cached = json_fragments.get(key)
+    if cached is not None and cached[0] == row.updated_at:
+        return cached[1]
+    fragment = current_app.json.dumps(serialize(row))
+    json_fragments.put(key, (row.updated_at, fragment))
+    return fragment
 
 class Note(db.Model):
 
@@ -10,9 +35,23 @@ class Note(db.Model):
     tags = db.Column(db.String(500), nullable=True)  # Store as comma-separated values
     event_date = db.Column(db.Date, nullable=True)
     event_time = db.Column(db.Time, nullable=True)
-    position = db.Column(db.Integer, nullable=True, default=0)
+    position = db.Column(db.Integer, nullable=True, default=0)  # legacy, see sort_key
+    # fractional ordering key (src/ordering.py); lists are ordered by (sort_key, id)
+    sort_key = db.Column(db.String(64), nullable=True)
+    # bumped by SQLAlchemy on every ORM update; PATCH deltas name the revision they apply to
+    revision = db.Column(db.Integer, nullable=False, default=1)
+    # saved from raw input while the LLM was unavailable; POST /notes/<id>/enrich fills it in
+    pending_enrichment = db.Column(db.Boolean, nullable=True, default=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        # matches the list ordering so keyset pages are index range scans
+        db.Index('ix_note_sort_key_id', 'sort_key', 'id'),
+        # agenda range scans: WHERE event_date BETWEEN .. ORDER BY event_date, event_time, id
+        db.Index('ix_note_event_date_time_id', 'event_date', 'event_time', 'id'),
+    )
+    __mapper_args__ = {'version_id_col': revision}
     
     def __repr__(self):
         return f'<Note {self.title}>'
@@ -27,7 +66,141 @@ class Note(db.Model):
             # return time in HH:MM format (no seconds) so frontend time inputs stay consistent
             'event_time': self.event_time.strftime('%H:%M') if self.event_time else None,
             'position': self.position if self.position is not None else 0,
+            'revision': self.revision,
+            'pending_enrichment': bool(self.pending_enrichment),
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
 
+    def to_json(self):
+        """to_dict() encoded as JSON (as jsonify would), served from json_fragments when unchanged."""
+        return _cached_json('full', self, Note.to_dict)
+
+    @classmethod
+    def summary_columns(cls):
+        """Columns selected for the summary view: everything but the full content."""
+        return (
+            cls.id, cls.title, cls.tags, cls.event_date, cls.event_time, cls.position,
+            cls.sort_key, cls.pending_enrichment, cls.created_at, cls.updated_at,
+            func.substr(cls.content, 1, PREVIEW_LENGTH).label('preview'),
+        )
+
+    @staticmethod
+    def summary_dict(row):
+        """Serialize a row selected with summary_columns (same keys as to_dict, minus content)."""
+        return {
+            'id': row.id,
+            'title': row.title,
+            'preview': row.preview or '',
+            'tags': row.tags.split(',') if row.tags else [],
+            'event_date': row.event_date.isoformat() if row.event_date else None,
+            'event_time': row.event_time.strftime('%H:%M') if row.event_time else None,
+            'position': row.position if row.position is not None else 0,
+            'pending_enrichment': bool(row.pending_enrichment),
+            'created_at': row.created_at.isoformat() if row.created_at else None,
+            'updated_at': row.updated_at.isoformat() if row.updated_at else None
+        }
+
+    @staticmethod
+    def summary_json(row):
+        """summary_dict() encoded as JSON, cached like to_json."""
+        return _cached_json('summary', row, Note.summary_dict)
+
+
+def rebalance_sort_keys(connection):
+    """Rewrite every sort key evenly spaced (short) while keeping the current order.
+
+    Notes without a key yet are placed after keyed ones, in legacy position order.
+    A row whose key changed after it was read (a concurrent move) keeps its new key.
+    The visible order does not change, so updated_at is left untouched, but the
+    notebook version is bumped in the same transaction since cursors and synced
+    copies carry the keys. Returns the new version, or None if nothing changed;
+    the caller invalidates the response cache once the transaction commits.
+    """
+    # imported here: notebook.py imports this module
+    from src.models.notebook import bump_version, record_changes
+    table = Note.__table__
+    rows = connection.execute(
+        select(table.c.id, table.c.sort_key).order_by(
+            table.c.sort_key.is_(None), table.c.sort_key,
+            table.c.position, table.c.updated_at.desc(), table.c.id
+        )
+    ).all()
+    changes = [
+        {'note_id': row.id, 'old_key': row.sort_key, 'new_key': key}
+        for row, key in zip(rows, evenly_spaced_keys(len(rows)))
+        if row.sort_key != key
+    ]
+    if not changes:
+        return None
+    connection.execute(
+        table.update()
+        .where(table.c.id == bindparam('note_id'),
+               table.c.sort_key.is_not_distinct_from(bindparam('old_key')))
+        .values(sort_key=bindparam('new_key'), updated_at=table.c.updated_at),
+        changes
+    )
+    seq = bump_version(connection)
+    record_changes(connection, seq, [change['note_id'] for change in changes])
+    return seq
+
+
+_rebalance_lock = threading.Lock()
+
+
+def _rebalance(app):
+    # one rebalance per process at a time; a skipped one is redone by the next long key
+    if not _rebalance_lock.acquire(blocking=False):
+        return
+    try:
+        with app.app_context():
+            with db.engine.begin() as conn:
+                version = rebalance_sort_keys(conn)
+            if version is not None:
+                response_cache.invalidate()
+    except Exception as e:
+        print(f"⚠️ Sort key rebalance failed: {e}")
+    finally:
+        _rebalance_lock.release()
+
+
+def top_sort_keys(connection, count):
+    """Keys for ``count`` notes going to the top of the list, each above the one before."""
+    first = connection.execute(select(func.min(Note.sort_key))).scalar()
+    # allocated together, so a large batch costs one step of key length, not one per note
+    return keys_before(first, count)[::-1]
+
+
+def flag_long_sort_keys(session, keys):
+    """Rebalance after ``session`` commits if any of ``keys`` is getting long.
+
+    Keys grow when notes keep landing in the same spot (top of the list, one
+    gap); respacing them keeps them well under the column width.
+    """
+    if any(key and len(key) > REBALANCE_KEY_LENGTH for key in keys):
+        session.info['rebalance_sort_keys'] = True
+
+
+@event.listens_for(Session, 'before_flush')
+def _assign_sort_keys(session, flush_context, instances):
+    # new notes go to the top of the list, as they did with position=0
+    new_notes = [obj for obj in session.new if isinstance(obj, Note) and obj.sort_key is None]
+    if new_notes:
+        keys = top_sort_keys(session.connection(), len(new_notes))
+        for note, key in zip(new_notes, keys):
+            note.sort_key = key
+    flag_long_sort_keys(session, [
+        obj.sort_key for obj in list(session.new) + list(session.dirty) if isinstance(obj, Note)
+    ])
+
+
+@event.listens_for(Session, 'after_commit')
+def _rebalance_after_commit(session):
+    if session.info.pop('rebalance_sort_keys', None) and has_app_context():
+        app = current_app._get_current_object()
+        threading.Thread(target=_rebalance, args=(app,), daemon=True).start()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_rebalance(session):
+    session.info.pop('rebalance_sort_keys', None)
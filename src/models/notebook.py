@@ -0,0 +1,97 @@
+"""Notebook-wide version counter and the per-note change log built on it.
+
+Every flush that touches notes bumps the counter once; the new value is the
+change sequence recorded for each note it created, modified or deleted.
+Deleted notes keep a tombstone row so sync clients can learn about them.
+"""
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+from src.models.user import db
+from src.models.note import Note
+
+
+class NotebookVersion(db.Model):
+    """Single-row table whose counter is bumped by every flush that touches notes."""
+
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+    @classmethod
+    def current(cls):
+        """Return the current notebook version without touching the notes table."""
+        version = db.session.execute(select(cls.version).where(cls.id == 1)).scalar()
+        return version or 0
+
+
+class NoteChange(db.Model):
+    """Latest change sequence per note; ``deleted`` marks a tombstone."""
+
+    note_id = db.Column(db.Integer, primary_key=True)
+    seq = db.Column(db.Integer, nullable=False)
+    deleted = db.Column(db.Boolean, nullable=False, default=False)
+
+    __table_args__ = (
+        db.Index('ix_note_change_seq_note', 'seq', 'note_id'),
+    )
+
+
+def bump_version(connection):
+    """Atomically increment the counter on ``connection`` and return the new value."""
+    table = NotebookVersion.__table__
+    result = connection.execute(
+        table.update().where(table.c.id == 1).values(version=table.c.version + 1)
+    )
+    if result.rowcount == 0:
+        connection.execute(table.insert().values(id=1, version=1))
+    return connection.execute(select(table.c.version).where(table.c.id == 1)).scalar()
+
+
+def record_changes(connection, seq, note_ids, deleted=False):
+    """Upsert the change-log rows for ``note_ids`` at sequence ``seq``."""
+    if not note_ids:
+        return
+    table = NoteChange.__table__
+    # delete + executemany insert keeps large flushes (batch writes) at two statements
+    connection.execute(table.delete().where(table.c.note_id.in_(note_ids)))
+    connection.execute(
+        table.insert(),
+        [{'note_id': note_id, 'seq': seq, 'deleted': deleted} for note_id in note_ids]
+    )
+
+
+def record_note_writes(session, written, removed):
+    """Bump the version and log ``written``/``removed`` note ids in ``session``'s transaction.
+
+    The flush listener below calls this for ORM writes; bulk statements that
+    bypass the flush call it themselves.
+    """
+    if not written and not removed:
+        return
+    connection = session.connection()
+    seq = bump_version(connection)
+    session.info['notebook_version'] = seq
+    record_changes(connection, seq, written)
+    record_changes(connection, seq, removed, deleted=True)
+
+
+def backfill_changes(connection):
+    """Give notes written before the change log existed an entry at sequence 0."""
+    notes = Note.__table__
+    changes = NoteChange.__table__
+    missing = select(notes.c.id, 0, False).where(
+        ~select(changes.c.note_id).where(changes.c.note_id == notes.c.id).exists()
+    )
+    connection.execute(changes.insert().from_select(['note_id', 'seq', 'deleted'], missing))
+
+
+@event.listens_for(Session, 'after_flush')
+def _bump_on_note_changes(session, flush_context):
+    # runs inside the flush's transaction, so the bump and the change log
+    # commit (or roll back) together with the note changes that caused them
+    written = [obj.id for obj in session.new if isinstance(obj, Note)]
+    written += [
+        obj.id for obj in session.dirty
+        if isinstance(obj, Note) and session.is_modified(obj)
+    ]
+    removed = [obj.id for obj in session.deleted if isinstance(obj, Note)]
+    record_note_writes(session, written, removed)
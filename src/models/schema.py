@@ -0,0 +1,69 @@
+"""Idempotent schema upgrades applied at startup.
+
+``db.create_all()`` only creates missing tables, so columns, indexes (and data
+fixes they depend on) added to existing models are applied here for databases
+created by older versions of the app, along with the full-text search index.
+"""
+from sqlalchemy import inspect, select, text
+from src.models.user import db
+from src.models.note import Note, rebalance_sort_keys
+from src.ordering import valid_key
+from src.models.notebook import NoteChange, backfill_changes
+from src.models.tag import NoteTag, rebuild_tag_index
+from src.models.translation import Translation
+from src.models.job import Job
+from src import response_cache
+
+
+def _add_missing_columns(engine, model):
+    """ALTER TABLE ADD COLUMN for model columns the table lacks (nullable columns only)."""
+    table = model.__table__
+    existing = {column['name'] for column in inspect(engine).get_columns(table.name)}
+    for column in table.columns:
+        if column.name in existing:
+            continue
+        column_type = column.type.compile(dialect=engine.dialect)
+        with engine.begin() as conn:
+            conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+
+
+def ensure_schema():
+    """Create missing columns and indexes and backfill values the list queries rely on."""
+    engine = db.engine
+    _add_missing_columns(engine, Note)
+    _add_missing_columns(engine, Translation)
+    _add_missing_columns(engine, Job)
+    for model in (Note, NoteChange, NoteTag, Translation):
+        for index in model.__table__.indexes:
+            index.create(bind=engine, checkfirst=True)
+
+    table = Note.__table__
+    rebalanced = None
+    with engine.begin() as conn:
+        # legacy NULL positions become 0 (the value to_dict already reports)
+        # so the sort-key backfill below orders them as the UI did
+        conn.execute(
+            table.update()
+            .where(table.c.position.is_(None))
+            .values(position=0, updated_at=table.c.updated_at)
+        )
+        backfill_changes(conn)
+        # revision is added as a nullable column on old tables; start them at 1
+        conn.execute(
+            table.update()
+            .where(table.c.revision.is_(None))
+            .values(revision=1, updated_at=table.c.updated_at)
+        )
+        rebuild_tag_index(conn)
+        # notes from before sort keys existed get keys in their old list order,
+        # and keys in the old bare-fraction format are rewritten in the current one
+        unkeyed = conn.execute(select(table.c.id).where(table.c.sort_key.is_(None)).limit(1)).first()
+        keys = conn.execute(select(table.c.sort_key).where(table.c.sort_key.isnot(None))).scalars().all()
+        if unkeyed or not all(valid_key(key) for key in keys):
+            rebalanced = rebalance_sort_keys(conn)
+    if rebalanced is not None:
+        response_cache.invalidate()
+
+    # imported here: the search module depends on the models being defined
+    from src.search_index import ensure_search_index
+    ensure_search_index(engine)
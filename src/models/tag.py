@@ -0,0 +1,87 @@
+"""Normalized tag index mirroring the comma-separated ``Note.tags`` column.
+
+``Note.tags`` stays the source of truth (and what the API returns); the
+tables here are rebuilt from it on every flush that writes a note's tags,
+so tag filters and per-tag counts are index lookups instead of string scans.
+"""
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session
+from src.models.user import db
+from src.models.note import Note
+
+
+class Tag(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), unique=True, nullable=False)
+
+
+class NoteTag(db.Model):
+    note_id = db.Column(db.Integer, primary_key=True)
+    tag_id = db.Column(db.Integer, primary_key=True)
+
+    __table_args__ = (
+        db.Index('ix_note_tag_tag_note', 'tag_id', 'note_id'),
+    )
+
+
+def split_tags(tags):
+    """Tag names from a comma-separated string: trimmed, non-empty, de-duplicated."""
+    names = []
+    for name in (tags or '').split(','):
+        name = name.strip()[:100]
+        if name and name not in names:
+            names.append(name)
+    return names
+
+
+def sync_note_tags(connection, note_tags):
+    """Replace the index rows for the notes in ``note_tags`` ({note_id: tags string})."""
+    if not note_tags:
+        return
+    tag_table = Tag.__table__
+    link_table = NoteTag.__table__
+    connection.execute(link_table.delete().where(link_table.c.note_id.in_(list(note_tags))))
+
+    wanted = {note_id: split_tags(tags) for note_id, tags in note_tags.items()}
+    names = {name for tag_names in wanted.values() for name in tag_names}
+    if not names:
+        return
+    ids = dict(connection.execute(
+        select(tag_table.c.name, tag_table.c.id).where(tag_table.c.name.in_(names))
+    ).all())
+    missing = names - ids.keys()
+    if missing:
+        connection.execute(tag_table.insert(), [{'name': name} for name in missing])
+        ids.update(connection.execute(
+            select(tag_table.c.name, tag_table.c.id).where(tag_table.c.name.in_(missing))
+        ).all())
+    connection.execute(link_table.insert(), [
+        {'note_id': note_id, 'tag_id': ids[name]}
+        for note_id, tag_names in wanted.items() for name in tag_names
+    ])
+
+
+def rebuild_tag_index(connection):
+    """Index every note's tags; used once for databases that predate the index."""
+    if connection.execute(select(NoteTag.__table__.c.note_id).limit(1)).first():
+        return
+    notes = Note.__table__
+    rows = connection.execute(
+        select(notes.c.id, notes.c.tags).where(notes.c.tags.isnot(None), notes.c.tags != '')
+    ).all()
+    sync_note_tags(connection, dict(rows))
+
+
+@event.listens_for(Session, 'after_flush')
+def _index_note_tags(session, flush_context):
+    note_tags = {
+        obj.id: obj.tags for obj in session.new if isinstance(obj, Note)
+    }
+    for obj in session.dirty:
+        if isinstance(obj, Note) and inspect(obj).attrs.tags.history.has_changes():
+            note_tags[obj.id] = obj.tags
+    for obj in session.deleted:
+        if isinstance(obj, Note):
+            note_tags[obj.id] = None
+    if note_tags:
+        sync_note_tags(session.connection(), note_tags)
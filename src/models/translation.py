@@ -0,0 +1,124 @@
+"""Cached LLM translations, in two tiers.
+
+An in-process LRU sits in front of the ``translation`` table, which every
+worker shares. Entries are per paragraph chunk (src/text_chunks.py), keyed by
+a hash of the model, the target language and the exact chunk text, so a hit
+is always a translation of the current text. Rows also remember the note and
+source chunk they came from: editing a note drops the rows for paragraphs it
+no longer contains, and deleting it drops them all, so re-translating an
+edited note only sends the changed paragraphs to the model.
+"""
+import hashlib
+import os
+from datetime import datetime
+from sqlalchemy import event, inspect, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from src.models.user import db
+from src.models.note import Note
+from src.lru import LRUCache
+from src.text_chunks import split_chunks, strip_chunk, source_hash
+
+translations = LRUCache(int(os.environ.get('TRANSLATION_CACHE_SIZE', 2000)))
+
+
+class Translation(db.Model):
+    key = db.Column(db.String(64), primary_key=True)
+    note_id = db.Column(db.Integer, nullable=True, index=True)
+    # sha256 of the source chunk, to tell which rows an edited note still uses
+    source_hash = db.Column(db.String(64), nullable=True)
+    target_language = db.Column(db.String(100), nullable=False)
+    model = db.Column(db.String(100), nullable=False)
+    translated_text = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+def translation_key(text, target_language, model):
+    normalized = ' '.join(target_language.split()).lower()
+    return hashlib.sha256('\0'.join((model, normalized, text)).encode('utf-8')).hexdigest()
+
+
+def cached_translation(key):
+    """Translated text for ``key`` from memory, then the table; None on a miss."""
+    text = translations.get(key)
+    if text is not None:
+        return text
+    row = db.session.get(Translation, key)
+    if row is None:
+        return None
+    translations.put(key, row.translated_text)
+    return row.translated_text
+
+
+def store_translations(note_id, target_language, model, items):
+    """Remember fresh translations in both tiers and commit them.
+
+    ``items`` is a list of (key, source text, translated text).
+    """
+    rows = []
+    for key, source, translated_text in items:
+        translations.put(key, translated_text)
+        rows.append(Translation(
+            key=key,
+            note_id=note_id,
+            source_hash=source_hash(source),
+            target_language=target_language[:100],
+            model=model,
+            translated_text=translated_text
+        ))
+    try:
+        db.session.add_all(rows)
+        db.session.commit()
+    except IntegrityError:
+        # another worker stored some of the same chunks first; keep the rest
+        db.session.rollback()
+        for row in rows:
+            try:
+                db.session.merge(row)
+                db.session.commit()
+            except IntegrityError:
+                db.session.rollback()
+
+
+def _live_hashes(title, content):
+    return {
+        source_hash(strip_chunk(chunk)[1])
+        for text in (title, content) for chunk in split_chunks(text)
+    }
+
+
+def drop_stale_translations(connection, edited, removed):
+    """Delete the rows edited notes no longer use and all rows of removed notes.
+
+    ``edited`` maps note id to its new (title, content).
+    """
+    if not edited and not removed:
+        return
+    table = Translation.__table__
+    rows = connection.execute(
+        select(table.c.key, table.c.note_id, table.c.source_hash)
+        .where(table.c.note_id.in_(list(edited) + list(removed)))
+    ).all()
+    live = {note_id: _live_hashes(*texts) for note_id, texts in edited.items()}
+    stale = [
+        row.key for row in rows
+        if row.note_id not in live or row.source_hash not in live[row.note_id]
+    ]
+    if stale:
+        connection.execute(table.delete().where(table.c.key.in_(stale)))
+        for key in stale:
+            translations.pop(key)
+
+
+@event.listens_for(Session, 'after_flush')
+def _drop_stale_translations(session, flush_context):
+    edited = {
+        obj.id: (obj.title, obj.content) for obj in session.dirty
+        if isinstance(obj, Note) and (
+            inspect(obj).attrs.title.history.has_changes()
+            or inspect(obj).attrs.content.history.has_changes()
+        )
+    }
+    removed = [obj.id for obj in session.deleted if isinstance(obj, Note)]
+    if edited or removed:
+        drop_stale_translations(session.connection(), edited, removed)
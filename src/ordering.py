@@ -0,0 +1,130 @@
+"""
+Fractional ordering keys for notes.
+
+A key is an integer part followed by an optional base-36 fraction, as in
+fractional-indexing/LexoRank, so plain string comparison orders notes. The
+integer part is a head character giving its sign and number of digits
+('i' = one digit, 'j' = two, ...; 'h', 'g', ... for negatives) and then the
+digits. Adding a note before the first or after the last key only steps the
+integer, so keys grow with the logarithm of the number of such inserts. A key
+strictly between any two keys always exists in the fraction, which lets a
+drag-and-drop move rewrite only the moved note; repeated inserts into the
+same gap make fractions longer, so rebalance_sort_keys() occasionally
+rewrites all keys.
+
+Only lowercase digits/letters are used so the order is the same under
+SQLite's binary collation and typical PostgreSQL locale collations.
+"""
+DIGITS = '0123456789abcdefghijklmnopqrstuvwxyz'
+BASE = len(DIGITS)
+# keys longer than this schedule a background rebalance
+REBALANCE_KEY_LENGTH = 16
+# head characters: DIGITS[18:] for integers >= 0 of 1..18 digits, DIGITS[:18] for negatives
+_ZERO_HEAD = 18
+_MAX_WIDTH = 18
+
+
+def _width(head):
+    index = DIGITS.index(head)
+    return index - _ZERO_HEAD + 1 if index >= _ZERO_HEAD else _ZERO_HEAD - index
+
+
+def _encode(n):
+    """Integer part for ``n``."""
+    width = 1
+    if n >= 0:
+        low = 0
+        while n >= low + BASE ** width:
+            low += BASE ** width
+            width += 1
+        head = _ZERO_HEAD + width - 1
+    else:
+        low = -BASE
+        while n < low:
+            width += 1
+            low -= BASE ** width
+        head = _ZERO_HEAD - width
+    if width > _MAX_WIDTH:
+        raise ValueError(f'{n} is out of the key range')
+    value = n - low
+    digits = []
+    for _ in range(width):
+        value, digit = divmod(value, BASE)
+        digits.append(DIGITS[digit])
+    return DIGITS[head] + ''.join(reversed(digits))
+
+
+def _decode(integer):
+    width = _width(integer[0])
+    value = int(integer[1:], BASE)
+    if DIGITS.index(integer[0]) >= _ZERO_HEAD:
+        return value + sum(BASE ** w for w in range(1, width))
+    return value - sum(BASE ** w for w in range(1, width + 1))
+
+
+def _split(key):
+    """(integer part, fraction) of ``key``."""
+    width = _width(key[0])
+    return key[:width + 1], key[width + 1:]
+
+
+def valid_key(key):
+    """Whether ``key`` is in this format (older databases stored bare fractions)."""
+    if not key or any(ch not in DIGITS for ch in key):
+        return False
+    integer, fraction = _split(key)
+    return len(integer) == _width(key[0]) + 1 and not fraction.endswith('0')
+
+
+def _midpoint(a, b):
+    """Fraction digits strictly between fractions a and b (b=None means 1.0)."""
+    if b is not None:
+        # skip the shared prefix (a padded with zeros)
+        n = 0
+        while n < len(b) and (a[n] if n < len(a) else '0') == b[n]:
+            n += 1
+        if n > 0:
+            return b[:n] + _midpoint(a[n:], b[n:])
+
+    digit_a = DIGITS.index(a[0]) if a else 0
+    digit_b = DIGITS.index(b[0]) if b is not None else BASE
+    if digit_b - digit_a > 1:
+        return DIGITS[(digit_a + digit_b) // 2]
+    # adjacent first digits: keep a's digit and go one level deeper
+    if b is not None and len(b) > 1:
+        return b[:1]
+    return DIGITS[digit_a] + _midpoint(a[1:], None)
+
+
+def key_between(a, b):
+    """Return a key that sorts after ``a`` and before ``b`` (either may be None)."""
+    if a is None and b is None:
+        return _encode(0)
+    if a is None:
+        integer, fraction = _split(b)
+        # the bare integer already sorts before its fractions
+        return integer if fraction else _encode(_decode(integer) - 1)
+    if b is None:
+        return _encode(_decode(_split(a)[0]) + 1)
+    if a >= b:
+        raise ValueError(f'{a!r} must sort before {b!r}')
+    integer_a, fraction_a = _split(a)
+    integer_b, fraction_b = _split(b)
+    if integer_a == integer_b:
+        return integer_a + _midpoint(fraction_a, fraction_b)
+    following = _encode(_decode(integer_a) + 1)
+    return following if following < b else integer_a + _midpoint(fraction_a, None)
+
+
+def keys_before(b, count):
+    """Return ``count`` increasing keys that all sort before ``b`` (None: the first keys)."""
+    if b is None:
+        return evenly_spaced_keys(count)
+    integer, fraction = _split(b)
+    top = _decode(integer) if fraction else _decode(integer) - 1
+    return [_encode(n) for n in range(top - count + 1, top + 1)]
+
+
+def evenly_spaced_keys(count):
+    """Return ``count`` increasing keys: consecutive integers from 0, so each is as short as possible."""
+    return [_encode(i) for i in range(count)]
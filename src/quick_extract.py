@@ -0,0 +1,352 @@
+"""
+Rule-based fast path for /notes/generate.
+
+Short inputs like "Badminton tmr 5pm @polyu" or "会议 11.2 下午3点" only need
+a date, a time and a couple of words of title, which a few English and
+Chinese rules get right. When a date or time was found and what is left is a
+short title already in the requested language, the note is built here
+without an LLM call; inputs with neither always go to the LLM. Otherwise the date and time that were found are passed
+to extract_structured_notes() as hints, so its prompt can drop the date rules.
+
+Ambiguous forms, weekday abbreviations ("sun", "sat") and bare month/day
+numbers ("1/2"), only count as dates next to a connector or a time, so
+"buy sun cream" and "read 1/2 book" are not dated; month names must be whole
+words, so "decide 2 options" is not December 2nd. The rules are checked
+against a corpus in tests/test_quick_extract.py.
+"""
+import re
+import threading
+from datetime import date, timedelta
+
+# inputs longer than this always go to the LLM
+MAX_INPUT_LENGTH = 80
+# a locally built title must stay below five words (as the LLM prompt asks)
+MAX_TITLE_WORDS = 4
+MAX_TITLE_CHARS_CJK = 10
+
+WEEKDAYS_EN = {
+    'mon': 0, 'monday': 0, 'tue': 1, 'tues': 1, 'tuesday': 1, 'wed': 2, 'wednesday': 2,
+    'thu': 3, 'thur': 3, 'thurs': 3, 'thursday': 3, 'fri': 4, 'friday': 4,
+    'sat': 5, 'saturday': 5, 'sun': 6, 'sunday': 6,
+}
+WEEKDAYS_ZH = {'一': 0, '二': 1, '三': 2, '四': 3, '五': 4, '六': 5, '日': 6, '天': 6}
+MONTHS_EN = {
+    'jan': 1, 'feb': 2, 'mar': 3, 'apr': 4, 'may': 5, 'jun': 6,
+    'jul': 7, 'aug': 8, 'sep': 9, 'oct': 10, 'nov': 11, 'dec': 12,
+}
+CN_DIGITS = {'零': 0, '一': 1, '二': 2, '两': 2, '三': 3, '四': 4, '五': 5, '六': 6, '七': 7, '八': 8, '九': 9}
+# left-over words that mean the input had a date/time the rules did not understand
+TEMPORAL_WORDS = {
+    'next', 'last', 'this', 'week', 'weekend', 'month', 'year', 'morning', 'afternoon',
+    'evening', 'night', 'day', 'days', 'hour', 'hours', 'o\'clock', 'oclock', 'am', 'pm',
+    'jan', 'feb', 'mar', 'apr', 'may', 'jun', 'jul', 'aug', 'sep', 'sept', 'oct', 'nov', 'dec',
+}
+TEMPORAL_CJK = re.compile(r'[年月日号號周週星期礼拜點点时時分早晚午天]')
+CJK = re.compile(r'[㐀-鿿]')
+LATIN = re.compile(r'[A-Za-z]')
+
+# optional connector in front of a date/time, consumed with it ("at 5pm", "on Fri")
+_LEAD = r'(?:\b(?:at|on|by|around|before|until)\s+)?'
+_WEEKDAY_EN = '|'.join(sorted(WEEKDAYS_EN, key=len, reverse=True))
+# full names or abbreviations only: "decide", "marathon", "junior" are not months
+_MONTH_EN = (r'(jan(?:uary)?|feb(?:ruary)?|mar(?:ch)?|apr(?:il)?|may|june?|july?|aug(?:ust)?'
+             r'|sep(?:t(?:ember)?)?|oct(?:ober)?|nov(?:ember)?|dec(?:ember)?)\b\.?')
+_CN_NUM = r'\d{1,2}|[零一二两三四五六七八九十]{1,3}'
+
+_counter_lock = threading.Lock()
+_counters = {'resolved_locally': 0, 'llm_with_hints': 0, 'llm': 0}
+
+
+def _cn_number(text):
+    """Value of "3", "三", "十二" or "二十五"; None for anything else (e.g. the range "三四")."""
+    if text.isdigit():
+        return int(text)
+    tens, ten, ones = text.partition('十')
+    if not ten:
+        return CN_DIGITS.get(text)
+    if (tens and tens not in CN_DIGITS) or (ones and ones not in CN_DIGITS):
+        return None
+    return (CN_DIGITS[tens] if tens else 1) * 10 + (CN_DIGITS[ones] if ones else 0)
+
+
+# what makes an ambiguous date ("sun", "1/2") a date: a connector in the match,
+# or a time right after or before it
+_CONNECTOR = re.compile(r'(?:at|on|by|around|before|until)\s', re.IGNORECASE)
+_TIME_AFTER = re.compile(
+    r'\s*(?:at\s+)?(?:'
+    r'\d{1,2}(?:[:：]\d{2})?\s*(?:am|pm|a\.m\.|p\.m\.)(?![a-z])|\d{1,2}[:：]\d{2}'
+    r'|(?:noon|midnight|morning|afternoon|evening|night)\b'
+    r'|凌晨|早上|早晨|上午|中午|下午|傍晚|晚上|(?:\d{1,2}|[零一二两三四五六七八九十]{1,3})[点點时時])',
+    re.IGNORECASE)
+_TIME_BEFORE = re.compile(
+    r'(?:\d{1,2}(?:[:：]\d{2})?\s*(?:am|pm|a\.m\.|p\.m\.)|\d{1,2}[:：]\d{2}|\bnoon|\bmidnight)\s*$',
+    re.IGNORECASE)
+
+
+def _anchored(match):
+    text = match.string
+    return bool(
+        _CONNECTOR.match(match.group(0))
+        or _TIME_AFTER.match(text, match.end())
+        or _TIME_BEFORE.search(text[:match.start()])
+    )
+
+
+def _make_date(year, month, day):
+    try:
+        return date(year, month, day)
+    except ValueError:
+        return None
+
+
+def _weekday(today, weekday, next_week):
+    if next_week:
+        # the given day of next calendar week (Monday-based, like 下周一)
+        return today + timedelta(days=7 - today.weekday() + weekday)
+    # the next such day, today included
+    return today + timedelta(days=(weekday - today.weekday()) % 7)
+
+
+def _clock(hour, minute, period):
+    if period == 'am':
+        hour = 0 if hour == 12 else hour
+    elif period == 'pm':
+        hour = hour + 12 if hour < 12 else hour
+    elif period == 'noon':
+        hour = hour + 12 if hour < 11 else hour
+    if 0 <= hour < 24 and 0 <= minute < 60:
+        return f'{hour:02d}:{minute:02d}'
+    return None
+
+
+def _relative(days, period=None):
+    def resolve(match, today, found):
+        if period and not found.get('period'):
+            found['period'] = period
+        return today + timedelta(days=days)
+    return resolve
+
+
+def _in_days(match, today, found):
+    days = _cn_number(match.group(1))
+    return today + timedelta(days=days) if days is not None else None
+
+
+def _full_date(match, today, found):
+    return _make_date(int(match.group(1)), int(match.group(2)), int(match.group(3)))
+
+
+def _short_date(match, today, found):
+    # month/day without a year means this year, like the LLM prompt's rule
+    return _make_date(today.year, int(match.group(1)), int(match.group(2)))
+
+
+def _bare_short_date(match, today, found):
+    # "1/2" may be a fraction or a ratio; only a neighbouring time makes it a date
+    return _short_date(match, today, found) if _anchored(match) else None
+
+
+def _month_name_day(match, today, found):
+    return _make_date(today.year, MONTHS_EN[match.group(1).lower()[:3]], int(match.group(2)))
+
+
+def _day_month_name(match, today, found):
+    return _make_date(today.year, MONTHS_EN[match.group(2).lower()[:3]], int(match.group(1)))
+
+
+def _weekday_en(match, today, found):
+    name = match.group(2).lower()
+    # "sun cream", "sat exam", "wed" as a word: abbreviations need next/this, a connector or a time
+    if len(name) <= 5 and not name.endswith('day') and not match.group(1) and not _anchored(match):
+        return None
+    return _weekday(today, WEEKDAYS_EN[name], (match.group(1) or '').strip().lower() == 'next')
+
+
+def _weekday_zh(match, today, found):
+    return _weekday(today, WEEKDAYS_ZH[match.group(2)], bool(match.group(1)) and match.group(1).startswith('下'))
+
+
+def _time_12h(match, today, found):
+    period = 'am' if match.group(3).lower().startswith('a') else 'pm'
+    return _clock(int(match.group(1)), int(match.group(2) or 0), period)
+
+
+def _time_24h(match, today, found):
+    return _clock(int(match.group(1)), int(match.group(2)), None)
+
+
+def _time_word(value):
+    def resolve(match, today, found):
+        return value
+    return resolve
+
+
+ZH_PERIODS = {
+    '凌晨': 'am', '早上': 'am', '早晨': 'am', '上午': 'am', '中午': 'noon',
+    '下午': 'pm', '傍晚': 'pm', '晚上': 'pm',
+}
+
+
+def _time_zh(match, today, found):
+    period = ZH_PERIODS.get(match.group(1)) or found.get('period')
+    hour = _cn_number(match.group(2))
+    if hour is None:
+        return None
+    minute = 0
+    if match.group(3) == '半':
+        minute = 30
+    elif match.group(3) == '一刻':
+        minute = 15
+    elif match.group(3) == '三刻':
+        minute = 45
+    elif match.group(4):
+        minute = _cn_number(match.group(4))
+        if minute is None:
+            return None
+    return _clock(hour, minute, period)
+
+
+# (kind, pattern, resolver), tried in order; the first match of each kind wins
+RULES = [(kind, re.compile(pattern, re.IGNORECASE), resolve) for kind, pattern, resolve in [
+    # full dates
+    ('date', _LEAD + r'\b(\d{4})[-/.](\d{1,2})[-/.](\d{1,2})\b', _full_date),
+    ('date', r'(\d{4})年(\d{1,2})月(\d{1,2})[日号號]?', _full_date),
+    # Chinese relative days (longest first)
+    ('date', r'大后天|大後天', _relative(3)),
+    ('date', r'后天|後天', _relative(2)),
+    ('date', r'明早', _relative(1, 'am')),
+    ('date', r'明晚', _relative(1, 'pm')),
+    ('date', r'明天|明日', _relative(1)),
+    ('date', r'今早', _relative(0, 'am')),
+    ('date', r'今晚', _relative(0, 'pm')),
+    ('date', r'今天|今日', _relative(0)),
+    ('date', r'昨天', _relative(-1)),
+    ('date', r'(' + _CN_NUM + r')天(?:后|後|以后|之后)', _in_days),
+    ('date', r'(下个?|这个?|本)?(?:周|週|星期|礼拜|禮拜)([一二三四五六日天])', _weekday_zh),
+    ('date', r'(\d{1,2})月(\d{1,2})[日号號]?', _short_date),
+    # English relative days
+    ('date', _LEAD + r'\b(?:the\s+)?day\s+after\s+(?:tomorrow|tmrw?)\b', _relative(2)),
+    ('date', _LEAD + r'\b(?:tomorrow|tmrw|tmr|tmw)\b', _relative(1)),
+    ('date', _LEAD + r'\btonight\b', _relative(0, 'pm')),
+    ('date', _LEAD + r'\b(?:today|tdy)\b', _relative(0)),
+    ('date', _LEAD + r'\byesterday\b', _relative(-1)),
+    ('date', _LEAD + r'\bin\s+(\d{1,2})\s+days?\b', _in_days),
+    ('date', _LEAD + r'\b(next\s+|this\s+)?(' + _WEEKDAY_EN + r')\b\.?', _weekday_en),
+    ('date', _LEAD + r'\b' + _MONTH_EN + r'\s+(\d{1,2})(?:st|nd|rd|th)?\b', _month_name_day),
+    ('date', _LEAD + r'\b(\d{1,2})(?:st|nd|rd|th)?\s+' + _MONTH_EN + r'(?![a-z])', _day_month_name),
+    # short dates: 11.2, 11/2
+    ('date', _LEAD + r'(?<![\d.:/])(1[0-2]|0?[1-9])[./](3[01]|[12]\d|0?[1-9])(?![\d.:/])', _bare_short_date),
+    # times
+    ('time', r'(凌晨|早上|早晨|上午|中午|下午|傍晚|晚上)?\s*(' + _CN_NUM + r')[点點时時](半|一刻|三刻|(' + _CN_NUM + r')分?)?',
+     _time_zh),
+    ('time', _LEAD + r'(?<![\d:])(1[0-2]|0?[1-9])(?::([0-5]\d))?\s*(am|pm|a\.m\.|p\.m\.)(?![a-z])', _time_12h),
+    ('time', _LEAD + r'(?<![\d:])([01]?\d|2[0-3])[:：]([0-5]\d)(?![\d:])', _time_24h),
+    ('time', _LEAD + r'\bnoon\b', _time_word('12:00')),
+    ('time', _LEAD + r'\bmidnight\b', _time_word('00:00')),
+]]
+
+
+def extract_hints(text, today=None):
+    """Find the date and time in ``text``.
+
+    Returns {'date': 'YYYY-MM-DD' or None, 'time': 'HH:MM' or None,
+    'rest': text with the date/time phrases removed}.
+    """
+    today = today or date.today()
+    found = {'date': None, 'time': None, 'period': None}
+    rest = text
+    for kind, pattern, resolve in RULES:
+        if found[kind] is not None:
+            continue
+        for match in pattern.finditer(rest):
+            value = resolve(match, today, found)
+            if value is not None:
+                found[kind] = value.isoformat() if isinstance(value, date) else value
+                rest = rest[:match.start()] + ' ' + rest[match.end():]
+                break
+    return {'date': found['date'], 'time': found['time'], 'rest': ' '.join(rest.split())}
+
+
+def _build_note(hints, lang):
+    """Structured note in the LLM's output format, or None if the input is not simple."""
+    if hints['date'] is None and hints['time'] is None:
+        # nothing for the rules to contribute; the LLM still adds tags and full notes
+        return None
+    rest = hints['rest'].strip(' ,.;:，。；：、-')
+    place = None
+    at = re.search(r'@\s*(\S+)', rest)
+    if at:
+        place = at.group(1)
+        rest = (rest[:at.start()] + rest[at.end():]).strip(' ,.;:，。；：、-')
+    tags = re.findall(r'#(\w+)', rest)[:3]
+    rest = ' '.join(re.sub(r'#\w+', ' ', rest).split())
+    if not rest:
+        return None
+
+    if lang == 'English':
+        words = rest.split()
+        if CJK.search(rest) or any(ch.isdigit() for ch in rest):
+            return None
+        if any(word.lower().strip('.,') in TEMPORAL_WORDS for word in words):
+            return None
+        title = rest[:1].upper() + rest[1:]
+        if place:
+            title += f' at {place}'
+        if len(title.split()) > MAX_TITLE_WORDS:
+            return None
+        notes = title
+        if hints['date']:
+            notes += f" on {hints['date']}"
+        if hints['time']:
+            notes += f" at {hints['time']}"
+        notes += '.'
+    elif lang == 'Chinese':
+        if not CJK.search(rest) or LATIN.search(rest) or TEMPORAL_CJK.search(rest):
+            return None
+        if any(ch.isdigit() for ch in rest) or len(rest.replace(' ', '')) > MAX_TITLE_CHARS_CJK:
+            return None
+        title = rest
+        notes = title
+        if place:
+            notes += f'，地点：{place}'
+        if hints['date']:
+            notes += f"，日期：{hints['date']}"
+        if hints['time']:
+            notes += f"，时间：{hints['time']}"
+        notes += '。'
+    else:
+        # other output languages need a translation, which only the LLM can do
+        return None
+
+    return {'Title': title, 'Notes': notes, 'Tags': tags, 'Date': hints['date'], 'Time': hints['time']}
+
+
+def quick_extract(text, lang='English', today=None):
+    """Try to structure ``text`` without the LLM.
+
+    Returns (note, hints): ``note`` is a dict in extract_structured_notes()'s
+    JSON format when the rules resolved the input, else None; ``hints`` holds
+    the date/time found either way (None if neither was found).
+    """
+    hints = extract_hints(text, today) if len(text) <= MAX_INPUT_LENGTH else None
+    note = _build_note(hints, lang) if hints else None
+    if not hints or (hints['date'] is None and hints['time'] is None):
+        hints = None
+    with _counter_lock:
+        if note is not None:
+            _counters['resolved_locally'] += 1
+        elif hints is not None:
+            _counters['llm_with_hints'] += 1
+        else:
+            _counters['llm'] += 1
+    return note, hints
+
+
+def stats():
+    """How many generate requests skipped the LLM, used hints, or needed the full prompt."""
+    with _counter_lock:
+        counters = dict(_counters)
+    total = sum(counters.values())
+    counters['skip_rate'] = round(counters['resolved_locally'] / total, 3) if total else None
+    return counters
+
@@ -0,0 +1,214 @@
+"""
+Optional response cache for hot note reads, shared by every worker on a host.
+
+Entries live in a small SQLite file (WAL mode), so all gunicorn workers see
+the same entries and the same invalidations, and a hit is served without
+touching SQLAlchemy at all. Each entry is tagged with the cache generation
+read *before* the response was built; any commit that changed notes bumps
+the generation and drops every entry, and stores tagged with an older
+generation are discarded, so a response computed from pre-write data can
+never be served after the write. Total size is bounded with LRU eviction.
+
+Enable with RESPONSE_CACHE=1 (file next to the app database) or
+RESPONSE_CACHE=/path/to/cache.db; see configure().
+"""
+import json
+import sqlite3
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+# response headers worth replaying; CORS and length are added per response
+STORED_HEADERS = ('Content-Type', 'ETag', 'Cache-Control', 'Link', 'X-Next-Cursor')
+# hits refresh an entry's recency at most this often, to keep hits read-only
+TOUCH_INTERVAL = 1.0
+
+_cache = None
+
+
+class ResponseCache:
+    def __init__(self, path, max_bytes, max_entry_bytes):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self._local = threading.local()
+        conn = self._connection()
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS meta (id INTEGER PRIMARY KEY, generation INTEGER NOT NULL)'
+        )
+        conn.execute('INSERT OR IGNORE INTO meta (id, generation) VALUES (1, 0)')
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS entries ('
+            ' key TEXT PRIMARY KEY, generation INTEGER NOT NULL, status INTEGER NOT NULL,'
+            ' headers TEXT NOT NULL, body BLOB NOT NULL, size INTEGER NOT NULL,'
+            ' last_used REAL NOT NULL)'
+        )
+        conn.execute('CREATE INDEX IF NOT EXISTS ix_entries_last_used ON entries (last_used)')
+
+    def _connection(self):
+        # sqlite3 connections must not be shared across threads
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def generation(self):
+        return self._connection().execute('SELECT generation FROM meta WHERE id = 1').fetchone()[0]
+
+    def get(self, key):
+        """Return (status, headers, body) for a current entry, or None."""
+        conn = self._connection()
+        row = conn.execute(
+            'SELECT e.status, e.headers, e.body, e.last_used FROM entries e'
+            ' JOIN meta m ON m.id = 1 AND e.generation = m.generation WHERE e.key = ?',
+            (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        now = time.time()
+        if now - row[3] > TOUCH_INTERVAL:
+            conn.execute('UPDATE entries SET last_used = ? WHERE key = ?', (now, key))
+        return row[0], json.loads(row[1]), row[2]
+
+    def put(self, key, generation, status, headers, body):
+        """Store an entry unless the cache was invalidated since ``generation`` was read."""
+        if len(body) > self.max_entry_bytes:
+            return
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            current = conn.execute('SELECT generation FROM meta WHERE id = 1').fetchone()[0]
+            if current != generation:
+                conn.execute('ROLLBACK')
+                return
+            conn.execute(
+                'INSERT OR REPLACE INTO entries (key, generation, status, headers, body, size, last_used)'
+                ' VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (key, generation, status, json.dumps(headers), body, len(body), time.time())
+            )
+            self._evict(conn)
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def _evict(self, conn):
+        total = conn.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        freed = 0
+        doomed = []
+        for key, size in conn.execute('SELECT key, size FROM entries ORDER BY last_used'):
+            doomed.append((key,))
+            freed += size
+            if total - freed <= self.max_bytes:
+                break
+        conn.executemany('DELETE FROM entries WHERE key = ?', doomed)
+
+    def invalidate(self):
+        """Bump the generation and drop every entry."""
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute('UPDATE meta SET generation = generation + 1 WHERE id = 1')
+            conn.execute('DELETE FROM entries')
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def stats(self):
+        count, size = self._connection().execute(
+            'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries'
+        ).fetchone()
+        return {'entries': count, 'bytes': size, 'max_bytes': self.max_bytes}
+
+
+def configure(path, max_bytes=64 * 1024 * 1024, max_entry_bytes=8 * 1024 * 1024):
+    """Enable the cache backed by the SQLite file at ``path``."""
+    global _cache
+    _cache = ResponseCache(path, max_bytes, max_entry_bytes)
+    return _cache
+
+
+def enabled():
+    return _cache is not None
+
+
+def stats():
+    return _cache.stats() if _cache is not None else None
+
+
+def invalidate():
+    """Drop every cached response; for writes made outside an ORM session."""
+    if _cache is None:
+        return
+    try:
+        _cache.invalidate()
+    except sqlite3.Error as e:
+        print(f"⚠️ Response cache invalidation failed: {e}")
+
+
+def lookup(key):
+    """Cached (status, headers, body) for ``key`` plus the generation to store under."""
+    try:
+        return _cache.get(key), _cache.generation()
+    except sqlite3.Error as e:
+        print(f"⚠️ Response cache lookup failed: {e}")
+        return None, None
+
+
+def _stored_headers(response):
+    return [(name, response.headers[name]) for name in STORED_HEADERS if name in response.headers]
+
+
+def _store(key, generation, status, headers, body):
+    try:
+        _cache.put(key, generation, status, headers, body)
+    except sqlite3.Error as e:
+        print(f"⚠️ Response cache store failed: {e}")
+
+
+def store(key, generation, response):
+    """Cache a 200 response; streamed bodies are captured as they are sent."""
+    if _cache is None or generation is None or response.status_code != 200:
+        return response
+    headers = _stored_headers(response)
+    if not response.is_streamed:
+        _store(key, generation, response.status_code, headers, response.get_data())
+        return response
+
+    def tee(chunks):
+        captured = []
+        size = 0
+        for chunk in chunks:
+            yield chunk
+            if captured is not None:
+                data = chunk.encode('utf-8') if isinstance(chunk, str) else chunk
+                size += len(data)
+                if size > _cache.max_entry_bytes:
+                    captured = None
+                else:
+                    captured.append(data)
+        if captured is not None:
+            _store(key, generation, 200, headers, b''.join(captured))
+
+    response.response = tee(response.response)
+    return response
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_on_note_commit(session):
+    # notebook.py records the new version in session.info when notes changed
+    if session.info.pop('notebook_version', None) is not None:
+        invalidate()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_rolled_back_version(session):
+    session.info.pop('notebook_version', None)
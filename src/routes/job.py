@@ -0,0 +1,38 @@
+from flask import Blueprint, jsonify, request
+from src.models.job import Job
+from src.models.user import db
+import time
+
+job_bp = Blueprint('job', __name__)
+
+# longest a status request may wait for the job to finish (?wait=seconds)
+MAX_WAIT_SECONDS = 25
+WAIT_POLL_SECONDS = 0.25
+
+
+@job_bp.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Get a background job's status and, once finished, the endpoint's response.
+
+    ``result`` holds the JSON body and ``status_code`` the HTTP status the
+    synchronous endpoint would have returned. ``?wait=N`` holds the request
+    for up to N seconds (max 25) until the job finishes, as a long poll.
+    """
+    job = db.session.get(Job, job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+
+    try:
+        wait = min(float(request.args.get('wait', 0)), MAX_WAIT_SECONDS)
+    except ValueError:
+        return jsonify({'error': 'wait must be a number of seconds'}), 400
+    deadline = time.monotonic() + wait
+    while job.status in ('queued', 'running') and time.monotonic() < deadline:
+        time.sleep(WAIT_POLL_SECONDS)
+        db.session.expire(job)
+
+    response = jsonify(job.to_dict())
+    response.headers['Cache-Control'] = 'no-store'
+    if job.status in ('queued', 'running'):
+        response.headers['Retry-After'] = '1'
+    return response
@@ -1,17 +1,349 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, jsonify, request, Response, stream_with_context, url_for, make_response, g
 from datetime import datetime
-from src.models.note import Note, db
-from src.llm import translate_to_language, extract_structured_notes
+from functools import wraps
+from src.models.note import Note, db, rebalance_sort_keys, top_sort_keys, flag_long_sort_keys
+from src.models.notebook import NotebookVersion, NoteChange, record_note_writes
+from src.models.tag import Tag, NoteTag, sync_note_tags
+from src.models.translation import translation_key, cached_translation, store_translations, drop_stale_translations
+from src.llm import (translate_to_language, translate_fields, stream_translation, extract_structured_notes,
+                     UnusableTranslation)
+from src import llm
+from src import llm_scheduler
+from src import search_index
+from src import jobs
+from src import idempotency
+from src import response_cache
+from src.ordering import key_between, evenly_spaced_keys
+from src.text_patch import apply_edits
+from src.quick_extract import quick_extract
+from src.text_chunks import split_chunks, strip_chunk
+from src.export_utils import iter_notes_ics
+from sqlalchemy import func, select, insert, update, delete
+from sqlalchemy.orm.exc import StaleDataError
+import base64
+import hashlib
 import json
+import os
+from concurrent.futures import ThreadPoolExecutor
 
 note_bp = Blueprint('note', __name__)
 
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+# rows fetched per round trip (and notes per chunk) when streaming the full list
+STREAM_BATCH_SIZE = 500
+
+
+# read endpoints served from the shared response cache when it is enabled
+CACHED_ENDPOINTS = ('note.get_notes', 'note.get_note', 'note.search_notes', 'note.get_agenda')
+
+
+@note_bp.before_request
+def serve_from_response_cache():
+    """Answer cacheable GETs from the shared response cache, skipping SQLAlchemy."""
+    if request.method != 'GET' or request.endpoint not in CACHED_ENDPOINTS:
+        return None
+    if not response_cache.enabled():
+        return None
+    key = request.full_path
+    cached, generation = response_cache.lookup(key)
+    if cached is None:
+        g.response_cache_entry = (key, generation)
+        return None
+
+    status, headers, body = cached
+    etag = dict(headers).get('ETag')
+    if etag and request.if_none_match.contains_weak(etag.strip('"')):
+        response = Response(status=304, headers=[h for h in headers if h[0] != 'Content-Type'])
+    else:
+        response = Response(body, status=status, headers=headers)
+    response.headers['X-Cache'] = 'HIT'
+    return response
+
+
+@note_bp.after_request
+def fill_response_cache(response):
+    entry = g.pop('response_cache_entry', None)
+    if entry is None:
+        return response
+    response.headers['X-Cache'] = 'MISS'
+    return response_cache.store(entry[0], entry[1], response)
+
+
+def _encode_cursor(values):
+    """Encode keyset values as an opaque, URL-safe cursor string."""
+    raw = json.dumps(values, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def _decode_cursor(cursor):
+    """Decode a cursor produced by _encode_cursor; raises ValueError if malformed."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except Exception:
+        raise ValueError('Invalid cursor')
+    if not isinstance(values, list):
+        raise ValueError('Invalid cursor')
+    return values
+
+
+def _page_size():
+    """Read the requested page size from ?limit=, clamped to MAX_PAGE_SIZE."""
+    limit = request.args.get('limit', type=int)
+    if limit is None:
+        return DEFAULT_PAGE_SIZE
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+
+def _next_page_headers(response, next_cursor):
+    """Attach the next-page cursor as both an X-Next-Cursor header and a Link header."""
+    if next_cursor is None:
+        return response
+    args = request.args.to_dict(flat=False)
+    args['cursor'] = [next_cursor]
+    next_url = url_for(request.endpoint, **(request.view_args or {}), **args)
+    response.headers['X-Next-Cursor'] = next_cursor
+    response.headers['Link'] = f'<{next_url}>; rel="next"'
+    return response
+
+
+def _json_array_response(rows, encode):
+    """JSON array response assembled from per-row JSON fragments."""
+    return Response('[' + ','.join(encode(row) for row in rows) + ']', mimetype='application/json')
+
+
+def _stream_json_array(query, encode):
+    """Stream query results as a JSON array, reading rows in batches via yield_per."""
+    def generate():
+        yield '['
+        chunk = []
+        first = True
+        for row in query.yield_per(STREAM_BATCH_SIZE):
+            chunk.append(encode(row) if first else ',' + encode(row))
+            first = False
+            if len(chunk) >= STREAM_BATCH_SIZE:
+                yield ''.join(chunk)
+                chunk = []
+        chunk.append(']')
+        yield ''.join(chunk)
+    return Response(stream_with_context(generate()), mimetype='application/json')
+
+
+def _view_query(default):
+    """Base query and JSON encoder for ?view=full|summary; raises ValueError otherwise."""
+    view = request.args.get('view', default)
+    if view == 'summary':
+        return db.session.query(*Note.summary_columns()), Note.summary_json
+    if view == 'full':
+        return Note.query, Note.to_json
+    raise ValueError('view must be "full" or "summary"')
+
+
+def etag_from_version(view):
+    """Serve a strong ETag derived from the notebook version and honour If-None-Match.
+
+    The version is read before the view runs, so a concurrent write can only
+    make the tag older than the body (forcing a refetch), never newer. A
+    matching If-None-Match returns 304 without querying or serializing notes.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        # every view/page/note is its own representation, so fold in the full path
+        path_digest = hashlib.sha1(request.full_path.encode('utf-8')).hexdigest()[:16]
+        etag = f'v{NotebookVersion.current()}-{path_digest}'
+        if request.if_none_match.contains_weak(etag):
+            response = Response(status=304)
+        else:
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+        response.set_etag(etag)
+        # let browsers keep the body but revalidate it on every use
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+    return wrapper
+
+
 @note_bp.route('/notes', methods=['GET'])
+@etag_from_version
 def get_notes():
-    """Get all notes, ordered by most recently updated"""
-    # Order by position (ascending) when available, then by most recently updated
-    notes = Note.query.order_by(Note.position.asc(), Note.updated_at.desc()).all()
-    return jsonify([note.to_dict() for note in notes])
+    """Get notes in list order, optionally paginated (limit/cursor) and filtered by tag."""
+    try:
+        query, encode = _view_query('full')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    query = query.order_by(Note.sort_key.asc(), Note.id.asc())
+
+    tags = [t.strip() for t in request.args.getlist('tag') if t.strip()]
+    if tags:
+        tag_mode = request.args.get('tag_mode', 'all')
+        if tag_mode not in ('all', 'any'):
+            return jsonify({'error': 'tag_mode must be "all" or "any"'}), 400
+        tagged = select(NoteTag.note_id).join(Tag, Tag.id == NoteTag.tag_id).where(Tag.name.in_(tags))
+        if tag_mode == 'all':
+            tagged = tagged.group_by(NoteTag.note_id).having(func.count() == len(set(tags)))
+        query = query.filter(Note.id.in_(tagged))
+
+    if 'limit' not in request.args and 'cursor' not in request.args:
+        return _stream_json_array(query, encode)
+
+    cursor = request.args.get('cursor')
+    if cursor:
+        try:
+            sort_key, last_id = _decode_cursor(cursor)
+        except (TypeError, ValueError):
+            return jsonify({'error': 'Invalid cursor'}), 400
+        query = query.filter(
+            (Note.sort_key > sort_key)
+            | ((Note.sort_key == sort_key) & (Note.id > last_id))
+        )
+
+    limit = _page_size()
+    notes = query.limit(limit + 1).all()
+    next_cursor = None
+    if len(notes) > limit:
+        notes = notes[:limit]
+        next_cursor = _encode_cursor([notes[-1].sort_key, notes[-1].id])
+
+    return _next_page_headers(_json_array_response(notes, encode), next_cursor)
+
+
+def _parse_event_time(value):
+    """Parse an HH:MM or HH:MM:SS string from the client; None if neither matches."""
+    for fmt in ('%H:%M', '%H:%M:%S'):
+        try:
+            return datetime.strptime(value, fmt).time()
+        except Exception:
+            pass
+    return None
+
+
+def _note_values(data):
+    """Column values for the client-supplied fields in ``data``; raises ValueError on bad input."""
+    values = {}
+    for field in ('title', 'content'):
+        if field in data:
+            if not isinstance(data[field], str):
+                raise ValueError(f'{field} must be a string')
+            values[field] = data[field]
+
+    if 'tags' in data:
+        if isinstance(data['tags'], list):
+            values['tags'] = ','.join(str(tag) for tag in data['tags'])
+        else:
+            values['tags'] = None
+
+    if 'event_date' in data:
+        if data['event_date']:
+            try:
+                values['event_date'] = datetime.strptime(data['event_date'], '%Y-%m-%d').date()
+            except (TypeError, ValueError):
+                raise ValueError('Invalid event_date format')
+        else:
+            values['event_date'] = None
+
+    # accept HH:MM or HH:MM:SS formats from client
+    if 'event_time' in data:
+        if data['event_time']:
+            parsed = _parse_event_time(data['event_time'])
+            if parsed is None:
+                raise ValueError('Invalid event_time format')
+            values['event_time'] = parsed
+        else:
+            values['event_time'] = None
+    return values
+
+
+def _apply_note_fields(note, data):
+    """Copy client-supplied fields onto ``note``; raises ValueError on bad input."""
+    for field, value in _note_values(data).items():
+        setattr(note, field, value)
+
+
+@note_bp.route('/tags', methods=['GET'])
+def get_tags():
+    """List tags with the number of notes carrying each, most used first."""
+    rows = db.session.query(Tag.name, func.count(NoteTag.note_id).label('count')).join(
+        NoteTag, NoteTag.tag_id == Tag.id
+    ).group_by(Tag.id, Tag.name).order_by(func.count(NoteTag.note_id).desc(), Tag.name).all()
+    return jsonify([{'name': row.name, 'count': row.count} for row in rows])
+
+
+def _agenda_range(query):
+    """Filter ``query`` to dated notes within ?from=/?to= (inclusive, YYYY-MM-DD)."""
+    query = query.filter(Note.event_date.isnot(None))
+    for param, compare in (('from', Note.event_date.__ge__), ('to', Note.event_date.__le__)):
+        value = request.args.get(param)
+        if value:
+            try:
+                bound = datetime.strptime(value, '%Y-%m-%d').date()
+            except ValueError:
+                raise ValueError(f'Invalid {param} date, expected YYYY-MM-DD')
+            query = query.filter(compare(bound))
+    # all-day notes (no time) first within a day, on every database
+    return query.order_by(Note.event_date.asc(), Note.event_time.asc().nulls_first(), Note.id.asc())
+
+
+@note_bp.route('/notes/agenda', methods=['GET'])
+@etag_from_version
+def get_agenda():
+    """Dated notes between ?from= and ?to=, ordered by date and time.
+
+    Served from the (event_date, event_time) index and paginated with
+    ``limit``/``cursor`` like GET /api/notes. Returns the summary view unless
+    ``view=full`` is given.
+    """
+    try:
+        query, encode = _view_query('summary')
+        query = _agenda_range(query)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    cursor = request.args.get('cursor')
+    if cursor:
+        try:
+            event_date, event_time, last_id = _decode_cursor(cursor)
+            event_date = datetime.strptime(event_date, '%Y-%m-%d').date()
+            event_time = datetime.strptime(event_time, '%H:%M:%S').time() if event_time else None
+        except (TypeError, ValueError):
+            return jsonify({'error': 'Invalid cursor'}), 400
+        if event_time is None:
+            same_day = Note.event_time.isnot(None) | (Note.event_time.is_(None) & (Note.id > last_id))
+        else:
+            same_day = (Note.event_time > event_time) | ((Note.event_time == event_time) & (Note.id > last_id))
+        query = query.filter((Note.event_date > event_date) | ((Note.event_date == event_date) & same_day))
+
+    limit = _page_size()
+    notes = query.limit(limit + 1).all()
+    next_cursor = None
+    if len(notes) > limit:
+        notes = notes[:limit]
+        last = notes[-1]
+        next_cursor = _encode_cursor([
+            last.event_date.isoformat(),
+            last.event_time.strftime('%H:%M:%S') if last.event_time else None,
+            last.id,
+        ])
+
+    return _next_page_headers(_json_array_response(notes, encode), next_cursor)
+
+
+@note_bp.route('/notes/agenda.ics', methods=['GET'])
+@etag_from_version
+def get_agenda_ics():
+    """Stream dated notes between ?from= and ?to= as an iCalendar feed."""
+    try:
+        query = _agenda_range(Note.query)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    feed = iter_notes_ics(query.yield_per(STREAM_BATCH_SIZE))
+    return Response(
+        stream_with_context(feed),
+        mimetype='text/calendar',
+        headers={'Content-Disposition': 'inline; filename="agenda.ics"'}
+    )
+
 
 @note_bp.route('/notes', methods=['POST'])
 def create_note():
@@ -21,29 +353,11 @@ def create_note():
         if not data or 'title' not in data or 'content' not in data:
             return jsonify({'error': 'Title and content are required'}), 400
         
-        # Initialize note with required fields
-        note = Note(title=data['title'], content=data['content'])
-        
-        # Handle optional fields
-        if 'tags' in data and isinstance(data['tags'], list):
-            note.tags = ','.join(data['tags'])
-        
-        if 'event_date' in data and data['event_date']:
-            note.event_date = datetime.strptime(data['event_date'], '%Y-%m-%d').date()
-            
-        if 'event_time' in data and data['event_time']:
-            # accept HH:MM or HH:MM:SS formats from client
-            et = data['event_time']
-            parsed = None
-            for fmt in ('%H:%M', '%H:%M:%S'):
-                try:
-                    parsed = datetime.strptime(et, fmt).time()
-                    break
-                except Exception:
-                    parsed = None
-            if parsed is None:
-                return jsonify({'error': 'Invalid event_time format'}), 400
-            note.event_time = parsed
+        note = Note()
+        try:
+            _apply_note_fields(note, data)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
         db.session.add(note)
         db.session.commit()
@@ -53,9 +367,153 @@ def create_note():
         return jsonify({'error': str(e)}), 500
 
 
+# concurrent LLM calls per translation, and how much text one structured call carries
+TRANSLATE_CONCURRENCY = int(os.environ.get('TRANSLATE_CONCURRENCY', 4))
+TRANSLATE_BATCH_CHARS = int(os.environ.get('TRANSLATE_BATCH_CHARS', 4000))
+
+
+def _translation_batches(texts):
+    """Group {name: text} in order into batches of at most TRANSLATE_BATCH_CHARS."""
+    batches = [{}]
+    size = 0
+    for name, text in texts.items():
+        if batches[-1] and size + len(text) > TRANSLATE_BATCH_CHARS:
+            batches.append({})
+            size = 0
+        batches[-1][name] = text
+        size += len(text)
+    return batches
+
+
+def _translate_batch(batch, target):
+    """One LLM round trip for a batch; None if the structured reply was unusable."""
+    if len(batch) == 1:
+        name, text = next(iter(batch.items()))
+        return {name: translate_to_language(text, target)}
+    try:
+        return translate_fields(batch, target)
+    except UnusableTranslation as e:
+        print(f"⚠️ Combined translation unusable ({e}); translating chunks separately")
+        return None
+
+
+def _translate_uncached(texts, target):
+    """Translate {name: text}: batches run concurrently, at most TRANSLATE_CONCURRENCY at once."""
+    batches = _translation_batches(texts)
+    results = {}
+    failed = {}
+    context = llm_scheduler.current_context()
+
+    def run(function, *args):
+        # pool threads schedule their LLM calls with the caller's priority and deadline
+        with llm_scheduler.using(context):
+            return function(*args)
+
+    with ThreadPoolExecutor(max_workers=min(TRANSLATE_CONCURRENCY, len(texts))) as pool:
+        for batch, translated in zip(batches, pool.map(lambda batch: run(_translate_batch, batch, target), batches)):
+            if translated is None:
+                failed.update(batch)
+            else:
+                results.update(translated)
+        # chunks of unusable batches are retried as single calls
+        futures = {name: pool.submit(run, translate_to_language, text, target) for name, text in failed.items()}
+        results.update({name: future.result() for name, future in futures.items()})
+    return results
+
+
+def _translate_cached(fields, target, note_id):
+    """Translate {name: text} chunk by chunk through the translation cache.
+
+    Each field is split into paragraph chunks; cached chunks are reused and
+    only the rest go to the LLM, then the field is reassembled in order.
+    Returns (translations, whether every chunk came from the cache).
+    """
+    layouts = {}
+    pending = {}
+    for name, text in fields.items():
+        layout = []
+        for i, chunk in enumerate(split_chunks(text)):
+            lead, core, trail = strip_chunk(chunk)
+            translated = None
+            if core:
+                key = translation_key(core, target, llm.model)
+                translated = cached_translation(key)
+                if translated is None:
+                    pending[f'{name}.{i}'] = (key, core)
+            layout.append((f'{name}.{i}', lead, core, trail, translated))
+        layouts[name] = layout
+
+    fresh = {}
+    if pending:
+        fresh = _translate_uncached({chunk_id: core for chunk_id, (key, core) in pending.items()}, target)
+        store_translations(note_id, target, llm.model, [
+            (key, core, fresh[chunk_id]) for chunk_id, (key, core) in pending.items()
+        ])
+
+    results = {
+        name: ''.join(
+            lead + (translated if translated is not None else fresh.get(chunk_id, core)) + trail
+            for chunk_id, lead, core, trail, translated in layout
+        )
+        for name, layout in layouts.items()
+    }
+    return results, not pending
+
+
+def _wants_async():
+    """True if the client sent ``Prefer: respond-async`` and background jobs are running here."""
+    preferences = request.headers.get('Prefer', '')
+    requested = any(
+        token.split(';')[0].strip().lower() == 'respond-async' for token in preferences.split(',')
+    )
+    return requested and jobs.enabled()
+
+
+def _accepted(job):
+    """202 pointing at the status URL of a queued background job."""
+    status_url = url_for('job.get_job', job_id=job.id)
+    response = jsonify({'job_id': job.id, 'status': job.status, 'status_url': status_url})
+    response.status_code = 202
+    response.headers['Location'] = status_url
+    response.headers['Preference-Applied'] = 'respond-async'
+    return response
+
+
+def _overloaded(e):
+    """(body, status) for an LLM call the scheduler could not make now."""
+    return {'error': str(e), 'retry_after': e.retry_after}, e.status_code
+
+
+def _llm_response(body, status):
+    """jsonify a (body, status) pair, adding Retry-After when the LLM was overloaded."""
+    response = jsonify(body)
+    response.status_code = status
+    if 'retry_after' in body:
+        response.headers['Retry-After'] = str(body['retry_after'])
+    return response
+
+
+def _run_translate(payload):
+    """Translate a note's title and content; returns (body, status) for the endpoint or a job."""
+    note = db.session.get(Note, payload['note_id'])
+    if note is None:
+        return {'error': 'Note not found'}, 404
+    try:
+        translated, cached = _translate_cached(
+            {'title': note.title or '', 'content': note.content or ''}, payload['target_language'], note.id
+        )
+    except llm_scheduler.Overloaded as e:
+        return _overloaded(e)
+    return {
+        'translated_title': translated['title'],
+        'translated_content': translated['content'],
+        'cached': cached
+    }, 200
+
+
 @note_bp.route('/notes/<int:note_id>/translate', methods=['POST'])
 def translate_note(note_id):
-    """Translate the content of a note to a target language using the llm helper."""
+    """Translate the content of a note to a target language using the llm helper (cached)."""
     try:
         note = Note.query.get_or_404(note_id)
         data = request.json or {}
@@ -63,23 +521,118 @@ def translate_note(note_id):
         if not target:
             return jsonify({'error': 'target_language is required'}), 400
 
-        # Call the llm helper to translate title and content
-        translated_title = translate_to_language(note.title or '', target)
-        translated_content = translate_to_language(note.content or '', target)
+        payload = {'note_id': note.id, 'target_language': target}
+        if _wants_async():
+            return _accepted(jobs.submit('translate', payload))
 
         # Return translated text (do not modify DB automatically)
-        return jsonify({
-            'translated_title': translated_title,
-            'translated_content': translated_content
-        }), 200
+        with llm_scheduler.deadline():
+            return _llm_response(*_run_translate(payload))
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@note_bp.route('/notes/<int:note_id>/translate/stream', methods=['GET'])
+def stream_translate_note(note_id):
+    """Translate a note like POST /translate, streaming the text as Server-Sent Events.
+
+    Sends ``delta`` events ({"field": "title"|"content", "text": ...}) as
+    tokens arrive, then one ``done`` event with the same body as the POST
+    endpoint, or an ``error`` event. Paragraph chunks found in the translation
+    cache arrive as single deltas and the rest are streamed one chunk at a
+    time. If the client disconnects the upstream LLM stream is closed, and
+    nothing is cached for the unfinished chunk.
+    """
+    note = db.session.get(Note, note_id)
+    if note is None:
+        return jsonify({'error': 'Note not found'}), 404
+    target = (request.args.get('target_language') or '').strip()
+    if not target:
+        return jsonify({'error': 'target_language is required'}), 400
+    fields = {'title': note.title or '', 'content': note.content or ''}
+
+    def generate():
+        translated = {}
+        all_cached = True
+        try:
+            for name, text in fields.items():
+                pieces = []
+                for chunk in split_chunks(text):
+                    lead, core, trail = strip_chunk(chunk)
+                    if lead:
+                        pieces.append(lead)
+                        yield _sse('delta', {'field': name, 'text': lead})
+                    if core:
+                        key = translation_key(core, target, llm.model)
+                        cached = cached_translation(key)
+                        if cached is not None:
+                            pieces.append(cached)
+                            yield _sse('delta', {'field': name, 'text': cached})
+                        else:
+                            all_cached = False
+                            chunk_pieces = []
+                            stream = stream_translation(core, target)
+                            try:
+                                for piece in stream:
+                                    chunk_pieces.append(piece)
+                                    yield _sse('delta', {'field': name, 'text': piece})
+                            finally:
+                                stream.close()
+                            result = ''.join(chunk_pieces)
+                            pieces.append(result)
+                            store_translations(note_id, target, llm.model, [(key, core, result)])
+                    if trail:
+                        pieces.append(trail)
+                        yield _sse('delta', {'field': name, 'text': trail})
+                translated[name] = ''.join(pieces)
+        except llm_scheduler.Overloaded as e:
+            yield _sse('error', {'error': str(e), 'retry_after': e.retry_after})
+            return
+        except Exception as e:
+            yield _sse('error', {'error': str(e)})
+            return
+        yield _sse('done', {
+            'translated_title': translated['title'],
+            'translated_content': translated['content'],
+            'cached': all_cached
+        })
+
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    # stop reverse proxies from buffering the stream
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
 @note_bp.route('/notes/<int:note_id>', methods=['GET'])
+@etag_from_version
 def get_note(note_id):
     """Get a specific note by ID"""
     note = Note.query.get_or_404(note_id)
-    return jsonify(note.to_dict())
+    return Response(note.to_json(), mimetype='application/json')
+
+def _current_revisions(note_ids):
+    """Roll back a write that lost a race with another save; {note id: current revision}."""
+    db.session.rollback()
+    return dict(db.session.execute(
+        select(Note.id, Note.revision).where(Note.id.in_(list(note_ids)))
+    ).all())
+
+
+def _stale_note(note_id):
+    """409 with the note's current revision, for a write someone else's save got ahead of."""
+    current = _current_revisions([note_id]).get(note_id)
+    return jsonify({'error': 'Stale base revision', 'revision': current}), 409
+
+
+def _stale_notes(note_ids):
+    """Like _stale_note, for writes to several notes."""
+    revisions = _current_revisions(note_ids)
+    return jsonify({'error': 'Notes were changed by another request', 'revisions': revisions}), 409
+
 
 @note_bp.route('/notes/<int:note_id>', methods=['PUT'])
 def update_note(note_id):
@@ -91,43 +644,58 @@ def update_note(note_id):
         if not data:
             return jsonify({'error': 'No data provided'}), 400
         
-        # Update basic fields
-        note.title = data.get('title', note.title)
-        note.content = data.get('content', note.content)
-        
-        # Update tags if provided
-        if 'tags' in data:
-            if isinstance(data['tags'], list):
-                note.tags = ','.join(data['tags'])
-            else:
-                note.tags = None
-                
-        # Update event date if provided
-        if 'event_date' in data:
-            if data['event_date']:
-                note.event_date = datetime.strptime(data['event_date'], '%Y-%m-%d').date()
-            else:
-                note.event_date = None
-                
-        # Update event time if provided (accept HH:MM or HH:MM:SS)
-        if 'event_time' in data:
-            if data['event_time']:
-                et = data['event_time']
-                parsed = None
-                for fmt in ('%H:%M', '%H:%M:%S'):
-                    try:
-                        parsed = datetime.strptime(et, fmt).time()
-                        break
-                    except Exception:
-                        parsed = None
-                if parsed is None:
-                    return jsonify({'error': 'Invalid event_time format'}), 400
-                note.event_time = parsed
-            else:
-                note.event_time = None
+        try:
+            _apply_note_fields(note, data)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
         db.session.commit()
         return jsonify(note.to_dict())
+    except StaleDataError:
+        # someone else saved between our read and write
+        return _stale_note(note_id)
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@note_bp.route('/notes/<int:note_id>', methods=['PATCH'])
+def patch_note(note_id):
+    """Apply a content delta (and optionally other fields) against a base revision.
+
+    Expects JSON: { "base_revision": 3,
+                    "edits": [{"start": 10, "end": 15, "text": "new"}],
+                    ...any PUT field except content... }
+    Edit offsets are UTF-16 code units into the content at ``base_revision``.
+    A stale base is rejected with 409 and the current revision. The reply is
+    the updated note without its content, so both directions stay small.
+    """
+    try:
+        note = Note.query.get_or_404(note_id)
+        data = request.json
+        if not data or not isinstance(data.get('base_revision'), int):
+            return jsonify({'error': 'base_revision is required'}), 400
+        if 'content' in data:
+            return jsonify({'error': 'Send content changes as edits, or use PUT'}), 400
+        if data['base_revision'] != note.revision:
+            return jsonify({'error': 'Stale base revision', 'revision': note.revision}), 409
+
+        try:
+            if data.get('edits'):
+                note.content = apply_edits(note.content, data['edits'])
+            _apply_note_fields(note, data)
+        except ValueError as e:
+            db.session.rollback()
+            return jsonify({'error': str(e)}), 400
+
+        try:
+            db.session.commit()
+        except StaleDataError:
+            # someone else saved between our read and write
+            return _stale_note(note_id)
+
+        result = note.to_dict()
+        del result['content']
+        return jsonify(result)
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
@@ -144,113 +712,497 @@ def delete_note(note_id):
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
+MAX_BATCH_SIZE = 1000
+BATCH_OPS = ('create', 'update', 'delete')
+
+
+@note_bp.route('/notes/batch', methods=['POST'])
+def batch_notes():
+    """Apply many create/update/delete operations in one transaction, with a result per operation."""
+    try:
+        data = request.json or {}
+        operations = data.get('operations')
+        if not isinstance(operations, list) or not operations:
+            return jsonify({'error': 'Operations list required'}), 400
+        if len(operations) > MAX_BATCH_SIZE:
+            return jsonify({'error': f'At most {MAX_BATCH_SIZE} operations per batch'}), 400
+        atomic = bool(data.get('atomic', False))
+
+        def note_id_of(item):
+            note_id = item.get('id')
+            return note_id if isinstance(note_id, int) and not isinstance(note_id, bool) else None
+
+        target_ids = {
+            note_id_of(item) for item in operations
+            if isinstance(item, dict) and item.get('op') in ('update', 'delete')
+        }
+        target_ids.discard(None)
+        # only what the writes need: revisions to check, texts to diff translations against
+        current = {}
+        if target_ids:
+            current = {row.id: row for row in db.session.execute(
+                select(Note.id, Note.revision, Note.title, Note.content).where(Note.id.in_(target_ids))
+            )}
+
+        results = []
+        creates = []     # (result, values)
+        updates = {}     # note id -> (results, merged values)
+        deleted_ids = set()
+        for index, item in enumerate(operations):
+            op = item.get('op') if isinstance(item, dict) else None
+            result = {'index': index, 'op': op}
+            results.append(result)
+            if op not in BATCH_OPS:
+                result.update(status=400, error=f'op must be one of {", ".join(BATCH_OPS)}')
+                continue
+
+            fields = item.get('data') if op != 'delete' else None
+            if fields is None:
+                fields = {}
+            if not isinstance(fields, dict):
+                result.update(status=400, error='data must be an object')
+                continue
+            if op == 'create':
+                if 'title' not in fields or 'content' not in fields:
+                    result.update(status=400, error='Title and content are required')
+                    continue
+            else:
+                note_id = note_id_of(item)
+                result['id'] = item.get('id')
+                if note_id is None:
+                    result.update(status=400, error='id must be an integer')
+                    continue
+                if note_id not in current or note_id in deleted_ids:
+                    result.update(status=404, error='Note not found')
+                    continue
+                if op == 'delete':
+                    deleted_ids.add(note_id)
+                    updates.pop(note_id, None)
+                    result['status'] = 204
+                    continue
+
+            try:
+                values = _note_values(fields)
+            except ValueError as e:
+                result.update(status=400, error=str(e))
+                continue
+            if op == 'create':
+                result['status'] = 201
+                creates.append((result, values))
+            else:
+                result['status'] = 200
+                earlier, merged = updates.get(note_id, ([], {}))
+                updates[note_id] = (earlier + [result], {**merged, **values})
+
+        failed = [r for r in results if r['status'] >= 400]
+        if atomic and failed:
+            return jsonify({'committed': False, 'results': results}), 400
+
+        connection = db.session.connection()
+        written, tag_changes, edited = [], {}, {}
+        if creates:
+            keys = top_sort_keys(connection, len(creates))
+            flag_long_sort_keys(db.session, keys)
+            # rows come back in any order (asking for parameter order makes SQLite
+            # insert one row per statement); the fresh sort keys tell them apart
+            notes = {note.sort_key: note for note in db.session.scalars(
+                insert(Note).returning(Note),
+                [dict(values, sort_key=key) for (_, values), key in zip(creates, keys)]
+            )}
+            for (result, _), key in zip(creates, keys):
+                note = notes[key]
+                result['id'] = note.id
+                result['note'] = note.to_dict()
+                written.append(note.id)
+                tag_changes[note.id] = note.tags
+        changed = {note_id: values for note_id, (_, values) in updates.items() if values}
+        if changed:
+            db.session.execute(update(Note), [
+                dict(values, id=note_id, revision=current[note_id].revision)
+                for note_id, values in changed.items()
+            ])
+            for note_id, values in changed.items():
+                if 'tags' in values:
+                    tag_changes[note_id] = values['tags']
+                if 'title' in values or 'content' in values:
+                    row = current[note_id]
+                    edited[note_id] = (values.get('title', row.title), values.get('content', row.content))
+            written += list(changed)
+        if updates:
+            # one SELECT for the replies; the bulk UPDATE leaves no loaded objects behind
+            refreshed = Note.query.filter(Note.id.in_(list(updates))).populate_existing()
+            for note in refreshed:
+                for result in updates[note.id][0]:
+                    result['note'] = note.to_dict()
+        if deleted_ids:
+            db.session.execute(delete(Note).where(Note.id.in_(deleted_ids)))
+            tag_changes.update(dict.fromkeys(deleted_ids))
+
+        # the flush listeners do not see bulk statements: keep the indexes in step here
+        sync_note_tags(connection, tag_changes)
+        drop_stale_translations(connection, edited, deleted_ids)
+        record_note_writes(db.session, written, list(deleted_ids))
+        db.session.commit()
+        return jsonify({'committed': True, 'results': results}), 200
+    except StaleDataError:
+        # an updated note was saved by someone else after we read its revision
+        revisions = _current_revisions(updates)
+        return jsonify({'committed': False, 'error': 'Notes were changed by another request',
+                        'revisions': revisions}), 409
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+
 @note_bp.route('/notes/search', methods=['GET'])
 def search_notes():
-    """Search notes by title or content"""
-    query = request.args.get('q', '')
+    """Full-text search over title and content, best matches first.
+
+    Results carry the summary fields plus a highlighted ``title_highlight`` and
+    ``snippet`` instead of the full content, paginated with ``limit``/``cursor``.
+    """
+    query = request.args.get('q', '').strip()
     if not query:
         return jsonify([])
-    
-    notes = Note.query.filter(
-        (Note.title.contains(query)) | (Note.content.contains(query))
-    ).order_by(Note.updated_at.desc()).all()
-    
-    return jsonify([note.to_dict() for note in notes])
+
+    offset = 0
+    cursor = request.args.get('cursor')
+    if cursor:
+        try:
+            (offset,) = _decode_cursor(cursor)
+            offset = int(offset)
+        except (TypeError, ValueError):
+            return jsonify({'error': 'Invalid cursor'}), 400
+
+    limit = _page_size()
+    results = search_index.search(query, limit + 1, offset)
+    next_cursor = None
+    if len(results) > limit:
+        results = results[:limit]
+        next_cursor = _encode_cursor([offset + limit])
+
+    return _next_page_headers(jsonify(results), next_cursor)
+
+
+@note_bp.route('/notes/changes', methods=['GET'])
+def get_note_changes():
+    """Delta sync: notes created/updated and ids deleted since a sync token.
+
+    ``since`` is the opaque ``next_since`` of a previous response (omit it for a
+    full initial sync). Changes come in change-sequence order, at most
+    ``limit`` per call; ``has_more`` says whether to poll again right away.
+    """
+    since_seq, since_id = -1, 0
+    since = request.args.get('since')
+    if since:
+        try:
+            since_seq, since_id = (int(v) for v in _decode_cursor(since))
+        except (TypeError, ValueError):
+            return jsonify({'error': 'Invalid sync token'}), 400
+
+    limit = _page_size()
+    rows = db.session.query(NoteChange, Note).outerjoin(
+        Note, Note.id == NoteChange.note_id
+    ).filter(
+        (NoteChange.seq > since_seq)
+        | ((NoteChange.seq == since_seq) & (NoteChange.note_id > since_id))
+    ).order_by(NoteChange.seq.asc(), NoteChange.note_id.asc()).limit(limit + 1).all()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    changes, deleted = [], []
+    for change, note in rows:
+        if change.deleted or note is None:
+            deleted.append(change.note_id)
+        else:
+            changes.append(note.to_dict())
+
+    if rows:
+        next_since = _encode_cursor([rows[-1][0].seq, rows[-1][0].note_id])
+    else:
+        next_since = since or _encode_cursor([since_seq, since_id])
+
+    return jsonify({
+        'changes': changes,
+        'deleted': deleted,
+        'next_since': next_since,
+        'has_more': has_more
+    })
 
 
 @note_bp.route('/notes/reorder', methods=['POST'])
 def reorder_notes():
-    """Reorder notes. Expects JSON: { "order": [<note_id>, ...] }"""
+    """Reorder notes. Expects JSON: { "order": [<note_id>, ...] }
+
+    Rewrites the key of every listed note; prefer /notes/<id>/move for
+    single drag-and-drop moves.
+    """
     try:
         data = request.json
         if not data or 'order' not in data or not isinstance(data['order'], list):
             return jsonify({'error': 'Order list required'}), 400
 
+        notes = {note.id: note for note in Note.query.filter(Note.id.in_(data['order']))}
+        keys = iter(evenly_spaced_keys(len(data['order'])))
         for idx, note_id in enumerate(data['order']):
-            note = Note.query.get(note_id)
+            key = next(keys)
+            note = notes.get(note_id)
             if note:
                 note.position = idx
+                note.sort_key = key
 
         db.session.commit()
         return jsonify({'status': 'ok'}), 200
+    except StaleDataError:
+        return _stale_notes(data['order'])
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
 
-@note_bp.route('/notes/generate', methods=['POST'])
-def generate_note():
-    """Generate a structured note from user input using LLM extraction."""
+def _neighbour_key(note_id):
+    row = db.session.execute(select(Note.sort_key).where(Note.id == note_id)).one_or_none()
+    if row is None:
+        raise LookupError(f'Note {note_id} not found')
+    return row.sort_key
+
+
+def _gap_around(note, after_id, before_id):
+    """Sort keys bounding the slot between the given neighbours, skipping ``note`` itself."""
+    lower = _neighbour_key(after_id) if after_id is not None else None
+    upper = _neighbour_key(before_id) if before_id is not None else None
+    if upper is None:
+        upper = db.session.execute(
+            select(func.min(Note.sort_key)).where(Note.sort_key > lower, Note.id != note.id)
+        ).scalar()
+    elif lower is None:
+        lower = db.session.execute(
+            select(func.max(Note.sort_key)).where(Note.sort_key < upper, Note.id != note.id)
+        ).scalar()
+    return lower, upper
+
+
+@note_bp.route('/notes/<int:note_id>/move', methods=['POST'])
+def move_note(note_id):
+    """Move one note between two neighbours, rewriting only that note's row.
+
+    Expects JSON: { "after": <id of the note it should follow, or null>,
+                    "before": <id of the note it should precede, or null> }
+    At least one neighbour is required; the other is looked up by key.
+    """
     try:
+        note = Note.query.get_or_404(note_id)
         data = request.json or {}
-        user_input = data.get('input', '').strip()
-        language = data.get('language', 'English')
-        
-        if not user_input:
-            return jsonify({'error': 'Input text is required'}), 400
+        after_id, before_id = data.get('after'), data.get('before')
+        if after_id is None and before_id is None:
+            return jsonify({'error': 'after or before is required'}), 400
+        if note_id in (after_id, before_id):
+            return jsonify({'error': 'A note cannot be its own neighbour'}), 400
+
+        try:
+            lower, upper = _gap_around(note, after_id, before_id)
+            if lower is not None and upper is not None and lower >= upper:
+                # equal keys from concurrent inserts leave no gap: respace and retry
+                version = rebalance_sort_keys(db.session.connection())
+                if version is not None:
+                    db.session.info['notebook_version'] = version
+                lower, upper = _gap_around(note, after_id, before_id)
+        except LookupError as e:
+            return jsonify({'error': str(e)}), 404
+        if lower is not None and upper is not None and lower >= upper:
+            return jsonify({'error': 'after must come before before'}), 409
+
+        note.sort_key = key_between(lower, upper)
+        db.session.commit()
+        return jsonify(note.to_dict()), 200
+    except StaleDataError:
+        return _stale_note(note_id)
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+
+def _extract(user_input, language):
+    """Structured-note JSON for the input: from local rules when simple enough, else the LLM."""
+    try:
+        local_note, hints = quick_extract(user_input, lang=language)
+    except Exception as e:
+        # a rule bug must not fail the request; the LLM can always do the work
+        print(f"⚠️ Local date/time rules failed on {user_input!r}: {e}")
+        local_note, hints = None, None
+    if local_note is not None:
+        return json.dumps(local_note, ensure_ascii=False)
+    return extract_structured_notes(user_input, lang=language, hints=hints)
 
-        # Call LLM to extract structured notes
-        llm_response = extract_structured_notes(user_input, lang=language)
+
+def _apply_structured(note, structured_data, title, content):
+    """Set a note's fields from extracted data; ``title``/``content`` are the defaults."""
+    note.title = structured_data.get('Title', title)
+    note.content = structured_data.get('Notes', content)
+    tags = structured_data.get('Tags', [])
+    date_str = structured_data.get('Date')
+    time_str = structured_data.get('Time')
+
+    # Add tags if provided
+    if tags and isinstance(tags, list):
+        note.tags = ','.join(tags[:3])  # Limit to 3 tags as per system prompt
+
+    # Add date if provided and valid
+    if date_str:
+        try:
+            note.event_date = datetime.strptime(date_str, '%Y-%m-%d').date()
+        except (ValueError, TypeError):
+            pass  # Skip invalid dates
+
+    # Add time if provided and valid
+    if time_str:
+        try:
+            note.event_time = datetime.strptime(time_str, '%H:%M').time()
+        except (ValueError, TypeError):
+            pass  # Skip invalid times
+
+
+def _save_unenriched(user_input, error):
+    """Degraded generate: keep the raw input as a note to enrich once the LLM is back."""
+    note = Note(title='Generated Note', content=user_input, pending_enrichment=True)
+    db.session.add(note)
+    db.session.commit()
+    return {
+        'note': note.to_dict(),
+        'pending_enrichment': True,
+        'warning': f'{error}; the input was saved as is and can be enriched later'
+    }, 201
+
+
+def _run_generate(payload):
+    """Extract a structured note with the LLM and save it; returns (body, status).
+
+    If the LLM cannot answer in time (circuit open, quota, deadline) the raw
+    input is saved with ``pending_enrichment`` set instead of failing.
+    """
+    user_input = payload['input']
+    language = payload['language']
+    try:
+        # Simple inputs are resolved by local rules; otherwise call LLM to extract structured notes
+        try:
+            llm_response = _extract(user_input, language)
+        except llm_scheduler.Overloaded as e:
+            return _save_unenriched(user_input, e)
         
         try:
             # Parse the JSON response from LLM
             structured_data = json.loads(llm_response)
-            
-            # Validate expected fields
-            title = structured_data.get('Title', 'Generated Note')
-            notes = structured_data.get('Notes', user_input)
-            tags = structured_data.get('Tags', [])
-            date_str = structured_data.get('Date')
-            time_str = structured_data.get('Time')
-            
+        
             # Create the note in database
-            note = Note(
-                title=title,
-                content=notes
-            )
-            
-            # Add tags if provided
-            if tags and isinstance(tags, list):
-                note.tags = ','.join(tags[:3])  # Limit to 3 tags as per system prompt
-            
-            # Add date if provided and valid
-            if date_str:
-                try:
-                    note.event_date = datetime.strptime(date_str, '%Y-%m-%d').date()
-                except (ValueError, TypeError):
-                    pass  # Skip invalid dates
-            
-            # Add time if provided and valid
-            if time_str:
-                try:
-                    note.event_time = datetime.strptime(time_str, '%H:%M').time()
-                except (ValueError, TypeError):
-                    pass  # Skip invalid times
-            
+            note = Note()
+            _apply_structured(note, structured_data, 'Generated Note', user_input)
+        
             db.session.add(note)
             db.session.commit()
-            
-            return jsonify({
+        
+            return {
                 'note': note.to_dict(),
                 'structured_data': structured_data
-            }), 201
-            
+            }, 201
+        
         except json.JSONDecodeError:
             # Fallback: create note with original input if LLM didn't return valid JSON
             note = Note(
                 title='Generated Note',
                 content=llm_response  # Use raw LLM response as content
             )
-            
+        
             db.session.add(note)
             db.session.commit()
-            
-            return jsonify({
+        
+            return {
                 'note': note.to_dict(),
                 'warning': 'LLM returned non-JSON response, used as content'
-            }), 201
+            }, 201
+
+    except Exception as e:
+        db.session.rollback()
+        return {'error': str(e)}, 500
+
+
+def _run_enrich(payload):
+    """Extract structure for a note saved by a degraded generate; returns (body, status)."""
+    note = db.session.get(Note, payload['note_id'])
+    if note is None:
+        return {'error': 'Note not found'}, 404
+    try:
+        structured_data = json.loads(_extract(note.content, payload['language']))
+        _apply_structured(note, structured_data, note.title, note.content)
+        note.pending_enrichment = False
+        db.session.commit()
+        return {'note': note.to_dict(), 'structured_data': structured_data}, 200
+    except llm_scheduler.Overloaded as e:
+        db.session.rollback()
+        return _overloaded(e)
+    except json.JSONDecodeError:
+        db.session.rollback()
+        return {'error': 'LLM returned non-JSON response'}, 502
+    except Exception as e:
+        db.session.rollback()
+        return {'error': str(e)}, 500
+
+
+@note_bp.route('/notes/generate', methods=['POST'])
+def generate_note():
+    """Generate a structured note from user input using LLM extraction; honours Idempotency-Key."""
+    try:
+        data = request.json or {}
+        user_input = data.get('input', '').strip()
+        language = data.get('language', 'English')
+        
+        if not user_input:
+            return jsonify({'error': 'Input text is required'}), 400
+
+        payload = {'input': user_input, 'language': language}
+
+        def respond():
+            if _wants_async():
+                return _accepted(jobs.submit('generate', payload))
+            with llm_scheduler.deadline():
+                return _llm_response(*_run_generate(payload))
+
+        key = request.headers.get('Idempotency-Key')
+        if not key:
+            return respond()
+        if len(key) > idempotency.MAX_KEY_LENGTH:
+            return jsonify({'error': f'Idempotency-Key must be at most {idempotency.MAX_KEY_LENGTH} characters'}), 400
+        try:
+            return idempotency.run_once('notes.generate', key, payload, respond)
+        except idempotency.KeyConflict:
+            return jsonify({'error': 'Idempotency-Key was already used with a different request'}), 422
+        except idempotency.KeyInFlight:
+            response = jsonify({'error': 'A request with this Idempotency-Key is still being processed'})
+            response.status_code = 409
+            response.headers['Retry-After'] = '1'
+            return response
             
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
+
+@note_bp.route('/notes/<int:note_id>/enrich', methods=['POST'])
+def enrich_note(note_id):
+    """Run LLM extraction on a note that generate saved unprocessed (``pending_enrichment``).
+
+    Accepts an optional ``language`` like generate, and ``Prefer: respond-async``.
+    """
+    note = db.session.get(Note, note_id)
+    if note is None:
+        return jsonify({'error': 'Note not found'}), 404
+    data = request.get_json(silent=True) or {}
+    payload = {'note_id': note.id, 'language': data.get('language', 'English')}
+    if _wants_async():
+        return _accepted(jobs.submit('enrich', payload))
+    with llm_scheduler.deadline():
+        return _llm_response(*_run_enrich(payload))
+
+
+jobs.register('generate', _run_generate)
+jobs.register('translate', _run_translate)
+jobs.register('enrich', _run_enrich)
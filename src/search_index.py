@@ -0,0 +1,271 @@
+"""
+Full-text search over note titles and content.
+
+SQLite uses an external-content FTS5 table kept in sync by triggers, ranked
+with bm25(). PostgreSQL uses a stored, generated tsvector column with a GIN
+index, ranked with ts_rank_cd(). Any other database (or a SQLite build
+without FTS5) falls back to the old LIKE scan so search keeps working. The
+trigram tokenizer cannot index terms under three characters, so queries made
+only of those scan note_fts with LIKE, still ranked title-first.
+
+Highlighted fields are HTML: the text is escaped and matches are wrapped in
+<mark>...</mark>, so clients can insert them as markup.
+"""
+import html
+import re
+from sqlalchemy import text
+from src.models.user import db
+from src.models.note import Note
+
+MARK_START = '<mark>'
+MARK_END = '</mark>'
+# the backends mark matches with private-use characters, which survive
+# html.escape() and are then swapped for the tags
+_SENTINEL_START = '\ue000'
+_SENTINEL_END = '\ue001'
+# tokens of context around matches in snippets; trigram tokens are single
+# characters, so that tokenizer gets FTS5's maximum instead
+SNIPPET_TOKENS = 24
+TRIGRAM_SNIPPET_TOKENS = 64
+# title matches count ten times as much as body matches
+TITLE_WEIGHT = 10.0
+
+# set by ensure_search_index(): 'fts5', 'postgres' or None (LIKE fallback)
+_backend = None
+# FTS5 tokenizer in use; trigram gives substring matching (incl. CJK text)
+_tokenizer = None
+
+
+def _create_fts5(conn, tokenizer):
+    conn.execute(text(
+        "CREATE VIRTUAL TABLE note_fts USING fts5("
+        "title, content, content='note', content_rowid='id', "
+        f"tokenize='{tokenizer}')"
+    ))
+
+
+def _ensure_sqlite(conn):
+    global _tokenizer
+    exists = conn.execute(text(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'note_fts'"
+    )).scalar()
+    if exists:
+        _tokenizer = 'trigram' if 'trigram' in exists else 'unicode61'
+    else:
+        try:
+            _create_fts5(conn, 'trigram')
+            _tokenizer = 'trigram'
+        except Exception:
+            # trigram needs SQLite 3.34+; word tokens are still far better than LIKE
+            _create_fts5(conn, 'unicode61')
+            _tokenizer = 'unicode61'
+
+    conn.execute(text(
+        "CREATE TRIGGER IF NOT EXISTS note_fts_ai AFTER INSERT ON note BEGIN "
+        "INSERT INTO note_fts(rowid, title, content) VALUES (new.id, new.title, new.content); "
+        "END"
+    ))
+    conn.execute(text(
+        "CREATE TRIGGER IF NOT EXISTS note_fts_ad AFTER DELETE ON note BEGIN "
+        "INSERT INTO note_fts(note_fts, rowid, title, content) "
+        "VALUES ('delete', old.id, old.title, old.content); "
+        "END"
+    ))
+    conn.execute(text(
+        "CREATE TRIGGER IF NOT EXISTS note_fts_au AFTER UPDATE OF title, content ON note BEGIN "
+        "INSERT INTO note_fts(note_fts, rowid, title, content) "
+        "VALUES ('delete', old.id, old.title, old.content); "
+        "INSERT INTO note_fts(rowid, title, content) VALUES (new.id, new.title, new.content); "
+        "END"
+    ))
+    if not exists:
+        # index notes written before the search table existed
+        conn.execute(text("INSERT INTO note_fts(note_fts) VALUES ('rebuild')"))
+
+
+def _ensure_postgres(conn):
+    conn.execute(text(
+        "ALTER TABLE note ADD COLUMN IF NOT EXISTS search_vector tsvector "
+        "GENERATED ALWAYS AS ("
+        "setweight(to_tsvector('simple', coalesce(title, '')), 'A') || "
+        "setweight(to_tsvector('simple', coalesce(content, '')), 'B')"
+        ") STORED"
+    ))
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_note_search_vector ON note USING GIN (search_vector)"
+    ))
+
+
+def ensure_search_index(engine):
+    """Create the search index for the current database and pick the search backend."""
+    global _backend
+    dialect = engine.dialect.name
+    try:
+        with engine.begin() as conn:
+            if dialect == 'sqlite':
+                _ensure_sqlite(conn)
+                _backend = 'fts5'
+            elif dialect == 'postgresql':
+                _ensure_postgres(conn)
+                _backend = 'postgres'
+            else:
+                _backend = None
+    except Exception as e:
+        print(f"⚠️ Full-text search unavailable ({e}); falling back to LIKE search")
+        _backend = None
+    return _backend
+
+
+def _fts5_match_expression(terms):
+    # quote every term so user input can never be parsed as FTS5 syntax
+    return ' '.join('"' + term.replace('"', '""') + '"' for term in terms)
+
+
+def _search_fts5(query, limit, offset):
+    terms = query.split()
+    if _tokenizer == 'trigram':
+        # trigram can only index terms of 3+ characters; shorter ones are
+        # checked with LIKE on the (already narrowed) matching rows
+        indexed = [t for t in terms if len(t) >= 3]
+        short = [t for t in terms if len(t) < 3]
+    else:
+        indexed, short = terms, []
+    if not indexed:
+        return _search_short(short, limit, offset)
+
+    filters = ''
+    params = {'match': _fts5_match_expression(indexed), 'limit': limit, 'offset': offset}
+    for i, term in enumerate(short):
+        filters += f" AND (note_fts.title LIKE :short{i} OR note_fts.content LIKE :short{i})"
+        params[f'short{i}'] = f'%{term}%'
+
+    snippet_tokens = TRIGRAM_SNIPPET_TOKENS if _tokenizer == 'trigram' else SNIPPET_TOKENS
+    rows = db.session.execute(text(
+        "SELECT note_fts.rowid AS id, "
+        f"bm25(note_fts, {TITLE_WEIGHT}, 1.0) AS score, "
+        "highlight(note_fts, 0, :mark_start, :mark_end) AS title_highlight, "
+        f"snippet(note_fts, 1, :mark_start, :mark_end, '…', {snippet_tokens}) AS snippet "
+        "FROM note_fts WHERE note_fts MATCH :match" + filters + " "
+        "ORDER BY score LIMIT :limit OFFSET :offset"
+    ), {**params, 'mark_start': _SENTINEL_START, 'mark_end': _SENTINEL_END}).all()
+    # bm25() is lower-is-better; expose a higher-is-better score
+    return [(row.id, -row.score, row.title_highlight, row.snippet) for row in rows]
+
+
+def _search_short(terms, limit, offset):
+    """Trigram search for queries made only of 1-2 character terms (e.g. two CJK characters).
+
+    The index cannot help with these, so note_fts is scanned with LIKE; notes
+    are ranked by which terms hit the title (TITLE_WEIGHT each) or the content.
+    """
+    params = {'limit': limit, 'offset': offset}
+    filters, score = [], []
+    for i, term in enumerate(terms):
+        params[f'term{i}'] = f'%{term}%'
+        filters.append(f"(title LIKE :term{i} OR content LIKE :term{i})")
+        score.append(f"(CASE WHEN title LIKE :term{i} THEN {TITLE_WEIGHT} ELSE 0 END"
+                     f" + CASE WHEN content LIKE :term{i} THEN 1 ELSE 0 END)")
+    rows = db.session.execute(text(
+        f"SELECT rowid AS id, title, content, {' + '.join(score)} AS score FROM note_fts "
+        f"WHERE {' AND '.join(filters)} "
+        "ORDER BY score DESC, rowid DESC LIMIT :limit OFFSET :offset"
+    ), params).all()
+    return [(row.id, row.score, _mark_terms(row.title or '', terms), _plain_snippet(row.content, terms))
+            for row in rows]
+
+
+def _search_postgres(query, limit, offset):
+    rows = db.session.execute(text(
+        "SELECT page.id, page.score, "
+        "ts_headline('simple', note.title, page.q, :title_options) AS title_highlight, "
+        "ts_headline('simple', note.content, page.q, :snippet_options) AS snippet "
+        "FROM ("
+        "  SELECT note.id, ts_rank_cd(note.search_vector, q, 32) AS score, q "
+        "  FROM note, websearch_to_tsquery('simple', :query) AS q "
+        "  WHERE note.search_vector @@ q "
+        "  ORDER BY score DESC, note.id LIMIT :limit OFFSET :offset"
+        ") AS page JOIN note ON note.id = page.id "
+        "ORDER BY page.score DESC, page.id"
+    ), {
+        'query': query,
+        'limit': limit,
+        'offset': offset,
+        'title_options': f'StartSel="{_SENTINEL_START}", StopSel="{_SENTINEL_END}", HighlightAll=true',
+        'snippet_options': (
+            f'StartSel="{_SENTINEL_START}", StopSel="{_SENTINEL_END}", '
+            f'MaxWords={SNIPPET_TOKENS * 2}, MinWords={SNIPPET_TOKENS}'
+        ),
+    }).all()
+    return [(row.id, row.score, row.title_highlight, row.snippet) for row in rows]
+
+
+def _mark_terms(value, terms):
+    """Wrap every case-insensitive occurrence of ``terms`` in ``value`` in sentinels."""
+    pattern = '|'.join(re.escape(term) for term in sorted(terms, key=len, reverse=True))
+    return re.sub(pattern, lambda m: _SENTINEL_START + m.group(0) + _SENTINEL_END, value, flags=re.IGNORECASE)
+
+
+def _plain_snippet(content, terms):
+    """Cut a window of content around the first match of ``terms`` for the LIKE searches."""
+    content = content or ''
+    width = SNIPPET_TOKENS * 4
+    pattern = '|'.join(re.escape(term) for term in terms)
+    match = re.search(pattern, content, flags=re.IGNORECASE)
+    if match is None:
+        return content[:width * 2]
+    start = max(0, match.start() - width)
+    end = match.end() + width
+    return (
+        ('…' if start > 0 else '')
+        + _mark_terms(content[start:end], terms)
+        + ('…' if end < len(content) else '')
+    )
+
+
+def _search_like(query, limit, offset):
+    notes = Note.query.filter(
+        (Note.title.contains(query)) | (Note.content.contains(query))
+    ).order_by(Note.updated_at.desc()).limit(limit).offset(offset).all()
+    return [(note.id, None, note.title, _plain_snippet(note.content, [query])) for note in notes]
+
+
+def _to_html(marked):
+    """Escape backend output and turn its sentinel characters into <mark> tags."""
+    if marked is None:
+        return None
+    return html.escape(marked).replace(_SENTINEL_START, MARK_START).replace(_SENTINEL_END, MARK_END)
+
+
+def search(query, limit, offset=0):
+    """Return up to ``limit`` matches for ``query`` starting at ``offset``, best first.
+
+    Each result has the summary-view fields of the note plus ``title_highlight``,
+    ``snippet`` (escaped HTML with <mark> around matches) and ``score``
+    (higher is better; None for the LIKE fallback).
+    """
+    hits = None
+    if _backend == 'fts5':
+        hits = _search_fts5(query, limit, offset)
+    elif _backend == 'postgres':
+        hits = _search_postgres(query, limit, offset)
+    if hits is None:
+        hits = _search_like(query, limit, offset)
+    if not hits:
+        return []
+
+    # full rows for the page only, by primary key
+    rows = db.session.query(*Note.summary_columns()).filter(Note.id.in_([h[0] for h in hits])).all()
+    by_id = {row.id: row for row in rows}
+    results = []
+    for note_id, score, title_highlight, snippet in hits:
+        row = by_id.get(note_id)
+        if row is None:
+            continue
+        result = Note.summary_dict(row)
+        result.update({
+            'title_highlight': _to_html(title_highlight),
+            'snippet': _to_html(snippet),
+            'score': score,
+        })
+        results.append(result)
+    return results
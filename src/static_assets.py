@@ -0,0 +1,72 @@
+"""
+In-memory static files for the single-page frontend.
+
+Every file under the static folder is read once at startup, together with
+precompressed variants, so serving the app shell is a dictionary lookup and a
+memory copy instead of a stat plus a file read per request. Edits to files on
+disk are picked up on the next restart.
+"""
+import hashlib
+import mimetypes
+import os
+
+from flask import Response, request
+
+from src.compression import COMPRESSIBLE_TYPES, ENCODINGS, compress, negotiate
+
+SHELL = 'index.html'
+MIN_COMPRESS_SIZE = 256
+# file names are not content-hashed, so other assets are cached for a bounded time
+ASSET_MAX_AGE = int(os.environ.get('STATIC_MAX_AGE', 3600))
+
+
+class StaticAsset:
+    def __init__(self, name, data):
+        self.mimetype = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+        self.digest = hashlib.sha256(data).hexdigest()[:32]
+        self.variants = {None: data}
+        if len(data) >= MIN_COMPRESS_SIZE and self.mimetype.startswith(COMPRESSIBLE_TYPES):
+            for encoding in ENCODINGS:
+                encoded = compress(data, encoding)
+                if len(encoded) < len(data):
+                    self.variants[encoding] = encoded
+        # the shell is always revalidated so a deploy shows up on the next load
+        self.cache_control = 'no-cache' if name == SHELL else f'public, max-age={ASSET_MAX_AGE}'
+
+    def etag(self, encoding):
+        # each encoded representation needs its own strong validator
+        return self.digest if encoding is None else f'{self.digest}-{encoding}'
+
+    def response(self):
+        """Serve the best variant for the current request, or 304 if the client has it."""
+        encodings = [e for e in self.variants if e is not None]
+        encoding = negotiate(request.accept_encodings, encodings) if encodings else None
+        etag = self.etag(encoding)
+
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+        else:
+            response = Response(self.variants[encoding], mimetype=self.mimetype)
+            if encoding is not None:
+                response.headers['Content-Encoding'] = encoding
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = self.cache_control
+        if encodings:
+            response.vary.add('Accept-Encoding')
+        return response
+
+
+class StaticAssets:
+    def __init__(self, folder):
+        self.assets = {}
+        if folder is None or not os.path.isdir(folder):
+            return
+        for root, _dirs, files in os.walk(folder):
+            for filename in files:
+                path = os.path.join(root, filename)
+                name = os.path.relpath(path, folder).replace(os.sep, '/')
+                with open(path, 'rb') as f:
+                    self.assets[name] = StaticAsset(name, f.read())
+
+    def get(self, name):
+        return self.assets.get(name)
@@ -0,0 +1,56 @@
+"""
+Split note text into paragraph-sized chunks for translation.
+
+Chunks are paragraphs (text between blank lines); a paragraph longer than
+MAX_CHUNK_CHARS is cut further at sentence ends. Joining the chunks gives
+back the original text exactly, blank-line separators included, so the
+translated chunks can be reassembled in order. Because chunks follow the
+paragraphs, editing one paragraph leaves the other chunks, and their cached
+translations, unchanged.
+"""
+import hashlib
+import os
+import re
+
+MAX_CHUNK_CHARS = int(os.environ.get('TRANSLATE_CHUNK_CHARS', 2000))
+
+_PARAGRAPH_BREAK = re.compile(r'(\n[ \t]*\n\s*)')
+_SENTENCE = re.compile(r'[^.!?。！？]*(?:[.!?。！？]+|$)\s*', re.S)
+
+
+def _split_long(paragraph):
+    """Pack whole sentences into pieces of at most MAX_CHUNK_CHARS."""
+    pieces = ['']
+    for sentence in _SENTENCE.findall(paragraph):
+        while len(sentence) > MAX_CHUNK_CHARS:
+            # a single over-long "sentence" is cut at the limit
+            pieces.append(sentence[:MAX_CHUNK_CHARS])
+            sentence = sentence[MAX_CHUNK_CHARS:]
+        if len(pieces[-1]) + len(sentence) > MAX_CHUNK_CHARS:
+            pieces.append('')
+        pieces[-1] += sentence
+    return [piece for piece in pieces if piece]
+
+
+def split_chunks(text):
+    """Split ``text`` into chunks whose concatenation is ``text``."""
+    chunks = []
+    for part in _PARAGRAPH_BREAK.split(text or ''):
+        if len(part) > MAX_CHUNK_CHARS and part.strip():
+            chunks.extend(_split_long(part))
+        elif part:
+            chunks.append(part)
+    return chunks
+
+
+def strip_chunk(chunk):
+    """Split a chunk into (leading whitespace, text to translate, trailing whitespace)."""
+    core = chunk.strip()
+    if not core:
+        return chunk, '', ''
+    start = chunk.index(core)
+    return chunk[:start], core, chunk[start + len(core):]
+
+
+def source_hash(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
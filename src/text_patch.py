@@ -0,0 +1,40 @@
+"""
+Apply range edits to note content for PATCH autosaves.
+
+Offsets are UTF-16 code units, the unit JavaScript string indices use, so a
+browser can compute them with plain ``String`` operations; text outside the
+Basic Multilingual Plane (e.g. emoji) then still lines up with Python strings.
+"""
+
+
+def apply_edits(content, edits):
+    """Return ``content`` with ``edits`` applied.
+
+    ``edits`` is a list of ``{"start": int, "end": int, "text": str}`` ranges
+    against the original content, sorted and non-overlapping. Raises
+    ValueError if any edit is malformed or out of range.
+    """
+    if not isinstance(edits, list):
+        raise ValueError('edits must be a list')
+
+    units = (content or '').encode('utf-16-le')
+    length = len(units) // 2
+    pieces = []
+    cursor = 0
+    for edit in edits:
+        if not isinstance(edit, dict):
+            raise ValueError('each edit must be an object')
+        start, end, text = edit.get('start'), edit.get('end', edit.get('start')), edit.get('text', '')
+        if not isinstance(start, int) or not isinstance(end, int) or not isinstance(text, str):
+            raise ValueError('edit start/end must be integers and text a string')
+        if start < cursor or end < start or end > length:
+            raise ValueError('edits must be sorted, non-overlapping and within the content')
+        pieces.append(units[cursor * 2:start * 2])
+        pieces.append(text.encode('utf-16-le'))
+        cursor = end
+    pieces.append(units[cursor * 2:])
+
+    try:
+        return b''.join(pieces).decode('utf-16-le')
+    except UnicodeDecodeError:
+        raise ValueError('edit splits a surrogate pair')
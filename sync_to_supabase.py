@@ -13,6 +13,10 @@ from dotenv import load_dotenv
 # 加载环境变量
 load_dotenv()
 
+DB_PATH = 'database/app.db'
+# 记录上次同步到的变更序号，下次只同步之后的变更
+SYNC_STATE_PATH = 'database/.supabase_sync_seq'
+
 def get_supabase_config():
     """获取 Supabase 配置"""
     url = os.getenv('SUPABASE_URL')
@@ -23,12 +27,126 @@ def get_supabase_config():
     
     return url, key
 
+def load_sync_seq():
+    """读取上次同步到的变更序号，没有则返回 None"""
+    try:
+        with open(SYNC_STATE_PATH) as f:
+            return int(f.read().strip())
+    except (OSError, ValueError):
+        return None
+
+def save_sync_seq(seq):
+    """保存本次同步到的变更序号"""
+    with open(SYNC_STATE_PATH, 'w') as f:
+        f.write(str(seq))
+
+def get_max_seq():
+    """读取本地变更日志当前的最大序号；没有变更日志（旧数据库）时返回 None"""
+    if not os.path.exists(DB_PATH):
+        return None
+    
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        # 空日志返回 -1，与首次增量同步的起点一致
+        return conn.execute("SELECT COALESCE(MAX(seq), -1) FROM note_change").fetchone()[0]
+    except sqlite3.OperationalError:
+        return None
+    finally:
+        conn.close()
+
+def get_local_changes(since_seq):
+    """从本地变更日志 (note_change) 获取 since_seq 之后新增/修改的笔记和被删除的笔记 ID
+
+    返回 (changed_notes, deleted_ids, max_seq)；旧数据库没有变更日志时返回 None
+    """
+    if not os.path.exists(DB_PATH):
+        print("❌ 本地数据库不存在")
+        return None
+    
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    
+    try:
+        cursor.execute("""
+            SELECT c.note_id, c.seq, c.deleted, n.title, n.content, n.created_at, n.updated_at
+            FROM note_change c
+            LEFT JOIN note n ON n.id = c.note_id
+            WHERE c.seq > ?
+            ORDER BY c.seq, c.note_id
+        """, (since_seq,))
+        rows = cursor.fetchall()
+    except sqlite3.OperationalError:
+        # 变更日志表不存在（旧版本数据库）
+        return None
+    finally:
+        conn.close()
+    
+    changed, deleted = [], []
+    max_seq = since_seq
+    for note_id, seq, is_deleted, title, content, created_at, updated_at in rows:
+        max_seq = max(max_seq, seq)
+        if is_deleted or title is None:
+            deleted.append(note_id)
+        else:
+            changed.append((note_id, title, content, created_at, updated_at))
+    print(f"📖 本地自序号 {since_seq} 起有 {len(changed)} 条笔记变更、{len(deleted)} 条删除")
+    return changed, deleted, max_seq
+
+def sync_changes_to_supabase(changed, deleted):
+    """增量同步：upsert 变更的笔记，删除已删除的笔记；返回失败数"""
+    url, key = get_supabase_config()
+    headers = {
+        'apikey': key,
+        'Authorization': f'Bearer {key}',
+        'Content-Type': 'application/json',
+        'Prefer': 'resolution=merge-duplicates,return=minimal'
+    }
+    
+    error_count = 0
+    if changed:
+        payload = [
+            {
+                'id': note_id,
+                'title': title,
+                'content': content,
+                'created_at': created_at,
+                'updated_at': updated_at
+            }
+            for note_id, title, content, created_at, updated_at in changed
+        ]
+        try:
+            # 一次请求批量 upsert 所有变更
+            response = requests.post(f'{url}/rest/v1/notes', headers=headers, data=json.dumps(payload))
+            if response.status_code in (200, 201, 204):
+                print(f"✅ 成功同步 {len(changed)} 条变更笔记")
+            else:
+                print(f"❌ 同步变更失败: {response.status_code} - {response.text}")
+                error_count += len(changed)
+        except Exception as e:
+            print(f"❌ 同步变更出错: {e}")
+            error_count += len(changed)
+    
+    if deleted:
+        ids = ','.join(str(note_id) for note_id in deleted)
+        try:
+            response = requests.delete(f'{url}/rest/v1/notes?id=in.({ids})', headers=headers)
+            if response.status_code in (200, 204):
+                print(f"🗑️  成功删除 {len(deleted)} 条笔记")
+            else:
+                print(f"❌ 删除失败: {response.status_code} - {response.text}")
+                error_count += len(deleted)
+        except Exception as e:
+            print(f"❌ 删除出错: {e}")
+            error_count += len(deleted)
+    
+    return error_count
+
 def get_local_notes():
-    """从本地 SQLite 获取所有笔记"""
-    db_path = 'database/app.db'
+    """从本地 SQLite 获取所有笔记；读取失败返回 None"""
+    db_path = DB_PATH
     if not os.path.exists(db_path):
         print("❌ 本地数据库不存在")
-        return []
+        return None
     
     conn = sqlite3.connect(db_path)
     cursor = conn.cursor()
@@ -44,22 +162,22 @@ def get_local_notes():
         return notes
     except Exception as e:
         print(f"❌ 读取本地数据失败: {e}")
-        return []
+        return None
     finally:
         conn.close()
 
 def sync_notes_to_supabase(notes):
-    """同步笔记到 Supabase"""
+    """全量同步笔记到 Supabase：新笔记插入，已存在的按 ID 覆盖更新；返回失败数"""
     if not notes:
         print("📝 没有笔记需要同步")
-        return
+        return 0
     
     url, key = get_supabase_config()
     headers = {
         'apikey': key,
         'Authorization': f'Bearer {key}',
         'Content-Type': 'application/json',
-        'Prefer': 'return=representation'
+        'Prefer': 'resolution=merge-duplicates,return=minimal'
     }
     
     # 首先检查 Supabase 中的现有数据
@@ -74,18 +192,14 @@ def sync_notes_to_supabase(notes):
     # 创建现有笔记ID集合
     existing_ids = {note['id'] for note in existing_notes}
     
-    # 同步新笔记
+    # upsert 所有笔记：远端已有的笔记可能是旧版本，同样要更新
     success_count = 0
+    updated_count = 0
     error_count = 0
     
     for note in notes:
         note_id, title, content, created_at, updated_at = note
         
-        # 跳过已存在的笔记
-        if note_id in existing_ids:
-            print(f"⏭️  跳过已存在的笔记 ID: {note_id}")
-            continue
-        
         note_data = {
             'id': note_id,
             'title': title,
@@ -101,9 +215,11 @@ def sync_notes_to_supabase(notes):
                 data=json.dumps(note_data)
             )
             
-            if response.status_code == 201:
+            if response.status_code in (200, 201, 204):
                 print(f"✅ 成功同步笔记: {title[:30]}...")
                 success_count += 1
+                if note_id in existing_ids:
+                    updated_count += 1
             else:
                 print(f"❌ 同步失败 {title[:30]}...: {response.status_code} - {response.text}")
                 error_count += 1
@@ -113,9 +229,9 @@ def sync_notes_to_supabase(notes):
             error_count += 1
     
     print(f"\n📊 同步完成:")
-    print(f"   ✅ 成功: {success_count} 条")
+    print(f"   ✅ 成功: {success_count} 条（其中更新已有笔记 {updated_count} 条）")
     print(f"   ❌ 失败: {error_count} 条")
-    print(f"   ⏭️  跳过: {len(notes) - success_count - error_count} 条")
+    return error_count
 
 def check_supabase_data():
     """检查 Supabase 中的数据"""
@@ -150,12 +266,22 @@ def main():
         get_supabase_config()
         print("✅ Supabase 配置正常")
         
-        # 2. 获取本地数据
-        local_notes = get_local_notes()
-        
-        # 3. 同步到 Supabase
-        if local_notes:
-            sync_notes_to_supabase(local_notes)
+        # 2. 优先按变更日志增量同步，只处理上次同步之后的变更
+        since_seq = load_sync_seq()
+        changes = get_local_changes(since_seq) if since_seq is not None else None
+        if changes is not None:
+            changed, deleted, max_seq = changes
+            if sync_changes_to_supabase(changed, deleted) == 0:
+                save_sync_seq(max_seq)
+        else:
+            # 首次同步（或旧数据库）：全量获取本地数据并同步到 Supabase。
+            # 序号在读取笔记之前记下，同步期间的新变更留给下次增量同步；
+            # 只有全部成功才保存，否则下次重新全量同步
+            baseline_seq = get_max_seq()
+            local_notes = get_local_notes()
+            if local_notes is not None and sync_notes_to_supabase(local_notes) == 0:
+                if baseline_seq is not None:
+                    save_sync_seq(baseline_seq)
         
         # 4. 检查同步结果
         print("\n" + "=" * 50)
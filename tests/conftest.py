@@ -0,0 +1,27 @@
+"""Shared fixtures."""
+import pytest
+
+
+@pytest.fixture(scope='session')
+def app(tmp_path_factory):
+    """The Flask app on a fresh SQLite database, shared by the whole run."""
+    # src.main picks its database from the environment at import time
+    mp = pytest.MonkeyPatch()
+    mp.setenv('DATABASE_URL', f"sqlite:///{tmp_path_factory.mktemp('db') / 'notes.db'}")
+    mp.delenv('VERCEL_ENV', raising=False)
+    from src.main import app
+    yield app
+    mp.undo()
+
+
+@pytest.fixture
+def fake_endpoint(monkeypatch):
+    """Point src.llm at a running FakeCompletions server."""
+    from src import llm
+    from tests.fake_llm import start_server
+    server = start_server()
+    monkeypatch.setattr(llm, 'endpoint', f'http://127.0.0.1:{server.server_port}/v1')
+    monkeypatch.setenv('GITHUB_TOKEN', 'fake-token')
+    yield server
+    server.shutdown()
+    server.server_close()
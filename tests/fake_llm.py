@@ -0,0 +1,60 @@
+"""
+A local fake of the OpenAI-compatible chat completions endpoint.
+
+Replies with the last message reversed and counts the TCP connections and
+requests it gets. Used by the tests and by the benchmarks under benchmarks/.
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeCompletions(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    # seconds each completion takes
+    delay = 0.0
+    connections = 0
+    requests = 0
+    lock = threading.Lock()
+
+    def setup(self):
+        super().setup()
+        with FakeCompletions.lock:
+            FakeCompletions.connections += 1
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        with FakeCompletions.lock:
+            FakeCompletions.requests += 1
+        time.sleep(FakeCompletions.delay)
+        payload = json.dumps({
+            'id': 'chatcmpl-fake',
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': body.get('model'),
+            'choices': [{
+                'index': 0,
+                'message': {'role': 'assistant', 'content': body['messages'][-1]['content'][::-1]},
+                'finish_reason': 'stop',
+            }],
+        }).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_server(delay=0.0):
+    """Serve FakeCompletions on a free local port from a daemon thread, with counters reset."""
+    FakeCompletions.delay = delay
+    FakeCompletions.connections = FakeCompletions.requests = 0
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakeCompletions)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,28 @@
+"""Batch note writes (POST /api/notes/batch)."""
+from sqlalchemy import func, select
+
+
+def test_full_batches_keep_sort_keys_short(app):
+    from src.models.note import Note
+    from src.models.user import db
+    from src.ordering import REBALANCE_KEY_LENGTH
+    from src.routes.note import MAX_BATCH_SIZE
+
+    client = app.test_client()
+    with app.app_context():
+        before = db.session.scalar(select(func.count()).select_from(Note))
+    for batch in range(2):
+        operations = [
+            {'op': 'create', 'data': {'title': f'{batch}-{i}', 'content': ''}}
+            for i in range(MAX_BATCH_SIZE)
+        ]
+        response = client.post('/api/notes/batch', json={'operations': operations})
+        assert response.status_code == 200, response.get_json()
+
+    with app.app_context():
+        rows = db.session.execute(select(Note.title, Note.sort_key).order_by(Note.sort_key, Note.id)).all()
+    assert len(rows) == before + 2 * MAX_BATCH_SIZE
+    assert max(len(key) for _, key in rows) < REBALANCE_KEY_LENGTH
+    # the last create of the latest batch is on top
+    assert [title for title, _ in rows[:2]] == [f'1-{MAX_BATCH_SIZE - 1}', f'1-{MAX_BATCH_SIZE - 2}']
+    assert rows[2 * MAX_BATCH_SIZE - 1].title == '0-0'
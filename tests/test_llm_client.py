@@ -0,0 +1,13 @@
+"""Pooled LLM client (src/llm.py): calls reuse kept-alive connections."""
+from src import llm
+from tests.fake_llm import FakeCompletions
+
+
+def test_sequential_calls_share_one_connection(fake_endpoint):
+    replies = [
+        llm.call_llm_model(llm.model, [{'role': 'user', 'content': f'hello {i}'}])
+        for i in range(3)
+    ]
+    assert replies == [f'hello {i}'[::-1] for i in range(3)]
+    assert FakeCompletions.requests == 3
+    assert FakeCompletions.connections == 1
@@ -0,0 +1,58 @@
+"""Fractional ordering keys (src/ordering.py)."""
+import random
+
+import pytest
+
+from src.ordering import REBALANCE_KEY_LENGTH, evenly_spaced_keys, key_between, keys_before, valid_key
+
+
+def test_prepending_grows_keys_logarithmically():
+    first = None
+    for _ in range(50000):
+        first = key_between(None, first)
+    assert len(first) <= 5
+
+
+def test_appending_grows_keys_logarithmically():
+    last = None
+    for _ in range(50000):
+        last = key_between(last, None)
+    assert len(last) <= 5
+
+
+def test_random_inserts_stay_ordered():
+    rng = random.Random(7)
+    keys = [key_between(None, None)]
+    for _ in range(3000):
+        at = rng.randint(0, len(keys))
+        before = keys[at - 1] if at else None
+        after = keys[at] if at < len(keys) else None
+        key = key_between(before, after)
+        assert valid_key(key)
+        assert (before is None or before < key) and (after is None or key < after)
+        keys.insert(at, key)
+    assert max(map(len, keys)) < REBALANCE_KEY_LENGTH
+
+
+def test_evenly_spaced_keys_are_short_and_increasing():
+    keys = evenly_spaced_keys(5000)
+    assert keys == sorted(keys) and len(set(keys)) == 5000
+    assert max(map(len, keys)) <= 4
+
+
+@pytest.mark.parametrize('first', [None, 'i0', 'i5i', 'hz'])
+def test_keys_before_fill_below_first(first):
+    keys = keys_before(first, 1000)
+    assert keys == sorted(keys) and len(set(keys)) == 1000
+    assert all(valid_key(key) for key in keys)
+    assert first is None or keys[-1] < first
+    assert max(map(len, keys)) <= 3
+
+
+@pytest.mark.parametrize('key, valid', [
+    ('i0', True), ('i5i', True), ('hz', True), ('j00', True),
+    # bare fractions stored by older versions
+    ('i', False), ('k', False), ('i5i0', False), ('I0', False), ('', False),
+])
+def test_valid_key(key, valid):
+    assert valid_key(key) == valid
@@ -0,0 +1,82 @@
+"""Rule-based generate fast path (src/quick_extract.py)."""
+from datetime import date
+
+import pytest
+
+from src.quick_extract import MAX_INPUT_LENGTH, _build_note, _cn_number, extract_hints, quick_extract
+
+# Friday, the date the LLM prompt's examples use
+TODAY = date(2025, 10, 24)
+
+# (input, output language, expected date, expected time, resolved without the LLM?)
+CORPUS = [
+    ('Badminton tmr 5pm @polyu', 'English', '2025-10-25', '17:00', True),
+    ('会议 11.2 下午3点', 'Chinese', '2025-11-02', '15:00', True),
+    ('后天上午开会', 'Chinese', '2025-10-26', None, False),
+    ('后天上午9点开会', 'Chinese', '2025-10-26', '09:00', True),
+    ('dentist next fri 3:30pm', 'English', '2025-10-31', '15:30', True),
+    ('gym tonight 7pm', 'English', '2025-10-24', '19:00', True),
+    ('Lunch with Tom at noon', 'English', None, '12:00', True),
+    ('team sync 3.15 at 14:00', 'English', '2025-03-15', '14:00', True),
+    ('project review on Nov 3rd', 'English', '2025-11-03', None, True),
+    ('call mom day after tomorrow', 'English', '2025-10-26', None, True),
+    ('flight 2025-12-25 08:15', 'English', '2025-12-25', '08:15', True),
+    ('明晚8点 吃饭', 'Chinese', '2025-10-25', '20:00', True),
+    ('下周一 交报告', 'Chinese', '2025-10-27', None, True),
+    ('周日 家庭聚会', 'Chinese', '2025-10-26', None, True),
+    ('3天后 体检', 'Chinese', '2025-10-27', None, True),
+    ('12月1日 晚上七点半 音乐会', 'Chinese', '2025-12-01', '19:30', True),
+    # no date or time: the LLM writes the note
+    ('buy milk', 'English', None, None, False),
+    ('Badminton tmr 5pm @polyu', 'Spanish', '2025-10-25', '17:00', False),
+    ('会议 11.2 下午3点', 'English', '2025-11-02', '15:00', False),
+    ('meeting with the design team about the new onboarding flow tmr 10am', 'English',
+     '2025-10-25', '10:00', False),
+    ('dinner next month', 'English', None, None, False),
+    ('remember to water the plants and feed the cat', 'English', None, None, False),
+    # weekday abbreviations count only next to a connector or a time
+    ('brunch on sat', 'English', '2025-10-25', None, True),
+    ('football sun 10am', 'English', '2025-10-26', '10:00', True),
+    ('buy sun cream', 'English', None, None, False),
+    ('sat exam', 'English', None, None, False),
+    # month names are whole words, not prefixes
+    ('party September 5', 'English', '2025-09-05', None, True),
+    ('trip 3 Sept', 'English', '2025-09-03', None, True),
+    ('decide 2 options', 'English', None, None, False),
+    ('separate 3 bins', 'English', None, None, False),
+    ('marathon 10 km', 'English', None, None, False),
+    ('junior 5 class', 'English', None, None, False),
+    ('augment 3 layers', 'English', None, None, False),
+    ('novel 4 chapters', 'English', None, None, False),
+    # so do bare month/day numbers
+    ('read 1/2 book', 'English', None, None, False),
+    ('mix 1/2 cup flour', 'English', None, None, False),
+    # number ranges are left to the LLM
+    ('三四点开会', 'Chinese', None, None, False),
+    ('下午三四点开会', 'Chinese', None, None, False),
+]
+
+
+@pytest.mark.parametrize('text, lang, want_date, want_time, want_local', CORPUS)
+def test_corpus(text, lang, want_date, want_time, want_local):
+    hints = extract_hints(text, TODAY)
+    note = _build_note(hints, lang) if len(text) <= MAX_INPUT_LENGTH else None
+    assert (hints['date'], hints['time'], note is not None) == (want_date, want_time, want_local)
+
+
+@pytest.mark.parametrize('text, title', [
+    ('brunch on sat', 'Brunch'),
+    ('party September 5', 'Party'),
+    ('Badminton tmr 5pm @polyu', 'Badminton at polyu'),
+])
+def test_local_titles(text, title):
+    note, _ = quick_extract(text, 'English', TODAY)
+    assert note['Title'] == title
+
+
+@pytest.mark.parametrize('text, value', [
+    ('3', 3), ('三', 3), ('十', 10), ('十二', 12), ('二十五', 25),
+    ('三四', None), ('十三四', None), ('半', None),
+])
+def test_cn_number(text, value):
+    assert _cn_number(text) == value
@@ -0,0 +1,20 @@
+"""Full-text search (src/search_index.py)."""
+import pytest
+
+from src import search_index
+
+
+def test_short_terms_rank_title_matches_first(app):
+    if search_index._tokenizer != 'trigram':
+        pytest.skip('needs the FTS5 trigram tokenizer (SQLite 3.34+)')
+    client = app.test_client()
+    body = client.post('/api/notes', json={'title': '周报', 'content': '下周一开会议 <b>准备</b>'}).get_json()
+    title = client.post('/api/notes', json={'title': '会议纪要', 'content': '讨论预算'}).get_json()
+    client.post('/api/notes', json={'title': '购物', 'content': '牛奶'})
+
+    results = client.get('/api/notes/search', query_string={'q': '会议'}).get_json()
+
+    assert [r['id'] for r in results] == [title['id'], body['id']]
+    assert results[0]['title_highlight'] == '<mark>会议</mark>纪要'
+    assert results[1]['snippet'] == '下周一开<mark>会议</mark> &lt;b&gt;准备&lt;/b&gt;'
+    assert results[0]['score'] > results[1]['score']